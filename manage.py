@@ -3,27 +3,181 @@ import csv
 import datetime
 import json
 import os
+import random
 import re
+import sqlite3
 import subprocess
+import threading
+import time
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from operator import itemgetter
 from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 
 import click
 import requests
 import tomli
 from ocdsextensionregistry import ExtensionRegistry
+from requests.adapters import HTTPAdapter
 
 extensions_url = "https://raw.githubusercontent.com/open-contracting/extension_registry/main/extensions.csv"
 extension_versions_url = (
     "https://raw.githubusercontent.com/open-contracting/extension_registry/main/extension_versions.csv"
 )
+cache_dir = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "standard-maintenance-scripts"
 
 
-def get(*args):
-    response = requests.get(*args, timeout=10)
-    response.raise_for_status()
-    return response
+class BudgetExhaustedError(click.ClickException):
+    def __init__(self, budget):
+        super().__init__(f"The budget of {budget} HTTP requests is exhausted.")
+
+
+class Client:
+    """
+    Send the HTTP requests of all commands.
+
+    Connections are pooled and kept alive. Requests to the GitHub API are authenticated with the ``GITHUB_TOKEN``
+    environment variable, if set. Connection errors and server errors are retried with exponential backoff and
+    jitter. Requests pause while GitHub's rate limit is exhausted, per the Retry-After and X-RateLimit-* headers. If a
+    budget is set, a command fails once it has sent that number of requests.
+    """
+
+    def __init__(self, *, retries=5, backoff=1, budget=None):
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=32))
+        self.token = os.getenv("GITHUB_TOKEN")
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.resume_at = 0
+
+    def request(self, method, url, *, headers=None, **kwargs):
+        headers = headers or {}
+        if self.token and urlsplit(url).netloc == "api.github.com":
+            headers = {"Authorization": f"Bearer {self.token}", **headers}
+
+        attempt = 0
+        while True:
+            with self.lock:
+                if self.budget is not None and self.sent >= self.budget:
+                    raise BudgetExhaustedError(self.budget)
+                self.sent += 1
+
+            delay = self.resume_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=10, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            else:
+                # Rate-limited requests are retried like server errors, after the rate limit resets.
+                retry = self.rate_limited(response) or response.status_code >= requests.codes.internal_server_error
+                if not retry or attempt >= self.retries:
+                    break
+
+            time.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.5))  # noqa: S311 # jitter
+            attempt += 1
+
+        response.raise_for_status()
+        return response
+
+    def rate_limited(self, response):
+        """Return whether the response was rate limited, and pause later requests if the rate limit is exhausted."""
+        headers = response.headers
+        if "Retry-After" in headers:
+            resume_at = retry_after(headers["Retry-After"])
+        elif headers.get("X-RateLimit-Remaining") == "0":
+            resume_at = int(headers["X-RateLimit-Reset"])
+        else:
+            return False
+
+        with self.lock:
+            self.resume_at = max(self.resume_at, resume_at)
+
+        return response.status_code in {403, 429}
+
+
+def retry_after(value):
+    """Return the time at which to retry, from the Retry-After header's delay in seconds or HTTP date."""
+    try:
+        return time.time() + int(value)
+    except ValueError:
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return time.time()
+
+
+client = Client()
+
+
+def request(*args, **kwargs):
+    return client.request(*args, **kwargs)
+
+
+def get(*args, **kwargs):
+    return request("GET", *args, **kwargs)
+
+
+def post(*args, **kwargs):
+    return request("POST", *args, **kwargs)
+
+
+def get_pages(executor, urls):
+    """
+    Return, for each URL, futures for the responses of all its pages.
+
+    The first pages are requested concurrently. Then, the number of pages is read from each first page's "last" link,
+    and the remaining pages are requested concurrently.
+    """
+    first_pages = [executor.submit(get, url) for url in urls]
+
+    pages = []
+    for future in first_pages:
+        futures = [future]
+        last = future.result().links.get("last", {}).get("url")
+        if last:
+            parts = urlsplit(last)
+            query = parse_qs(parts.query)
+            for page in range(2, int(query["page"][0]) + 1):
+                query["page"] = [page]
+                futures.append(executor.submit(get, urlunsplit(parts._replace(query=urlencode(query, doseq=True)))))
+        pages.append(futures)
+
+    return pages
+
+
+def get_registry_index(*, profiles=False):
+    """
+    Return the registered extensions, keyed by the lowercase full name of their repository (owner/name).
+
+    Each value is a dict with the repository's versions in the registry, whether the extension is core, and, if
+    ``profiles`` is set, the profiles that include the extension.
+    """
+    memberships = defaultdict(list)
+    if profiles:
+        format_string = (
+            "https://raw.githubusercontent.com/open-contracting-extensions/{}/{}/docs/extension_versions.json"
+        )
+        for profile, branch in (("european-union", "latest"), ("public-private-partnerships", "1.0-dev")):
+            for extension_id in get(format_string.format(profile, branch)).json():
+                memberships[extension_id].append(profile)
+
+    index = {}
+    for version in ExtensionRegistry(extension_versions_url, extensions_url):
+        full_name = version.repository_full_name.lower()
+        if full_name not in index:
+            index[full_name] = {"versions": [], "core": version.core, "profiles": memberships[version.id]}
+        index[full_name]["versions"].append(version)
+
+    return index
 
 
 def default(obj):
@@ -33,28 +187,67 @@ def default(obj):
 
 
 @click.group()
-def cli():
-    pass
+@click.option("--retries", type=int, default=5, show_default=True, help="Retries after a server or connection error")
+@click.option("--budget", type=int, help="Maximum number of HTTP requests")
+def cli(retries, budget):
+    client.retries = retries
+    client.budget = budget
 
 
 @cli.command()
 @click.argument("path")
 @click.option("--match", help="")
-def download_extensions(path, match):
+@click.option("--depth", type=int, help="Create shallow clones with this number of commits")
+@click.option("--blobless", is_flag=True, help="Create blobless clones, which download file contents on demand")
+@click.option("--update", is_flag=True, help="Fetch existing clones")
+@click.option("--workers", type=int, default=8, help="Maximum number of concurrent git commands")
+def download_extensions(path, match, depth, blobless, update, workers):
     """Download all registered extensions to a directory."""
     path = path.rstrip("/")
 
-    for version in ExtensionRegistry(extension_versions_url):
-        if not match or match in version.base_url:
+    options = []
+    if depth:
+        options.append(f"--depth={depth}")
+    if blobless:
+        options.append("--filter=blob:none")
+
+    jobs = []
+    for entry in get_registry_index().values():
+        if not match or any(match in version.base_url for version in entry["versions"]):
+            version = entry["versions"][0]
             directory = os.path.join(path, version.repository_name)
             if not os.path.isdir(directory):
-                command = ["git", "clone", version.repository_url, directory]
-                click.echo(" ".join(command))
-                subprocess.call(command)  # noqa: S603 # trusted input
+                jobs.append((directory, "cloned", ["git", "clone", *options, version.repository_url, directory]))
+            elif update:
+                jobs.append((directory, "updated", ["git", "-C", directory, "fetch", "--prune"]))
+
+    def run(command):
+        click.echo(" ".join(command))
+        # Fail instead of prompting for credentials, as commands run concurrently.
+        return subprocess.run(  # noqa: S603 # trusted input
+            command, capture_output=True, text=True, env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}, check=False
+        )
+
+    counts = Counter()
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        processes = executor.map(run, (command for _, _, command in jobs))
+        for (directory, status, _), process in zip(jobs, processes, strict=True):
+            if process.returncode:
+                failed.append(directory)
+                click.secho(f"{directory}: {process.stderr.strip()}", fg="red", err=True)
+            else:
+                counts[status] += 1
+
+    click.echo(f"{counts['cloned']} cloned, {counts['updated']} updated, {len(failed)} failed")
+    for directory in failed:
+        click.echo(f"  {directory}")
 
 
 @cli.command()
-def set_topics():
+@click.option("--dry-run", is_flag=True, help="Print the changes to topics, without making them")
+@click.option("--workers", type=int, default=8, help="Maximum number of concurrent requests")
+def set_topics(dry_run, workers):
     """
     Add topics to repositories in the open-contracting-extensions organization.
 
@@ -64,16 +257,12 @@ def set_topics():
     -  ocds-profile
     -  european-union
     -  public-private-partnerships
-    """
-    format_string = "https://raw.githubusercontent.com/open-contracting-extensions/{}/{}/docs/extension_versions.json"
 
-    profiles = defaultdict(list)
-    for profile, branch in (("european-union", "latest"), ("public-private-partnerships", "1.0-dev")):
-        for extension_id in get(format_string.format(profile, branch)).json():
-            profiles[extension_id].append(profile)
-
-    registry = ExtensionRegistry(extension_versions_url, extensions_url)
+    Only repositories whose topics differ are updated.
+    """
+    index = get_registry_index(profiles=True)
 
+    changes = {}
     for repo in get("https://api.github.com/orgs/open-contracting-extensions/repos?per_page=100").json():
         topics = []
         name = repo["name"]
@@ -83,24 +272,35 @@ def set_topics():
         else:
             topics.append("ocds-profile")
 
-        for version in registry:
-            if f"/{repo['full_name']}/" in version.base_url:
-                if version.core:
-                    topics.append("ocds-core-extension")
-                else:
-                    topics.append("ocds-community-extension")
-                topics.extend(profiles[version.id])
-                break
-        else:
-            if "ocds-profile" not in topics:
-                click.echo(f"{name} is not registered")
+        if entry := index.get(repo["full_name"].lower()):
+            if entry["core"]:
+                topics.append("ocds-core-extension")
+            else:
+                topics.append("ocds-community-extension")
+            topics.extend(entry["profiles"])
+        elif "ocds-profile" not in topics:
+            click.echo(f"{name} is not registered")
+
+        diff = [f"+{topic}" for topic in sorted(set(topics) - set(repo["topics"]))]
+        diff.extend(f"-{topic}" for topic in sorted(set(repo["topics"]) - set(topics)))
+        if diff:
+            click.echo(f"{name}: {' '.join(diff)}")
+            changes[repo["full_name"]] = topics
+
+    if dry_run:
+        return
 
-        requests.put(
-            f"https://api.github.com/repos/{repo['full_name']}/topics",
-            data=json.dumps({"names": topics}),
+    def put(full_name):
+        request(
+            "PUT",
+            f"https://api.github.com/repos/{full_name}/topics",
+            json={"names": changes[full_name]},
             headers={"accept": "application/vnd.github.mercy-preview+json"},
-            timeout=10,
-        ).raise_for_status()
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Raise any exception.
+        list(executor.map(put, changes))
 
 
 @cli.command()
@@ -297,40 +497,106 @@ def count_dependencies(directory):
 @cli.command()
 @click.argument("organization")
 @click.option("--commenters", is_flag=True, help="Include issue commenters")
+@click.option("--full", is_flag=True, help="Retrieve all issue comments, not only those since the last run")
+@click.option(
+    "--database",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=cache_dir / "contributors.sqlite3",
+    show_default=True,
+    help="SQLite database of issue commenters",
+)
 @click.option("--verbose", is_flag=True, help="Dump contributors data")
-def github_contributors(organization, commenters, verbose):
-    """Report the number of contributors to an organization's repositories."""
+@click.option("--workers", type=int, default=8, help="Maximum number of concurrent requests")
+def github_contributors(organization, commenters, full, database, verbose, workers):
+    """
+    Report the number of contributors to an organization's repositories.
+
+    Issue commenters are stored in a database, with the time of the last comment retrieved for each repository, so
+    that later runs retrieve only new comments.
+    """
     contributors = set()
     contributors_by_repository = {}
 
     repos = get(f"https://api.github.com/orgs/{organization}/repos?type=sources&per_page=100").json()
     click.echo(f"Retrieving metadata for {len(repos)} source repositories..")
-    for i, repo in enumerate(repos, 1):
-        name = repo["name"]
-        logins = set()
-
-        click.echo(f"{i:2d} {name} ", nl=False)
 
+    if commenters:
+        database.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(database)
+        connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS repository (full_name TEXT PRIMARY KEY, since TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS commenter (full_name TEXT, login TEXT, PRIMARY KEY (full_name, login));
+            -- GitHub's organization and repository names are case-insensitive, so names are stored in lowercase.
+            UPDATE OR REPLACE repository SET full_name = lower(full_name) WHERE full_name != lower(full_name);
+            UPDATE OR IGNORE commenter SET full_name = lower(full_name) WHERE full_name != lower(full_name);
+            DELETE FROM commenter WHERE full_name != lower(full_name);
+            """
+        )
+        if full:
+            with connection:
+                pattern = f"{organization.lower()}/*"
+                connection.execute("DELETE FROM repository WHERE full_name GLOB ?", (pattern,))
+                connection.execute("DELETE FROM commenter WHERE full_name GLOB ?", (pattern,))
+        since = dict(connection.execute("SELECT full_name, since FROM repository"))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
         if commenters:
-            url = f"https://api.github.com/repos/{repo['full_name']}/issues/comments?per_page=100"
-            while url:
-                response = get(url)
+            urls = []
+            for repo in repos:
+                url = f"https://api.github.com/repos/{repo['full_name']}/issues/comments?per_page=100"
+                if repo["full_name"].lower() in since:
+                    url += f"&since={since[repo['full_name'].lower()]}"
+                urls.append(url)
+            comment_pages = get_pages(executor, urls)
+        else:
+            comment_pages = [[] for _ in repos]
+        contributor_pages = [executor.submit(get, f"{repo['contributors_url']}?per_page=100") for repo in repos]
+
+        # Report repositories in order, as their responses become available.
+        for i, (repo, futures, future) in enumerate(zip(repos, comment_pages, contributor_pages, strict=True), 1):
+            name = repo["name"]
+            logins = set()
+
+            click.echo(f"{i:2d} {name} ", nl=False)
+
+            if commenters:
+                full_name = repo["full_name"].lower()
+                latest = since.get(full_name, "")
+                for page in futures:
+                    for comment in page.result().json():
+                        if not comment["user"]["login"].endswith("[bot]"):
+                            logins.add(comment["user"]["login"])
+                        # ISO 8601 timestamps in UTC sort lexically.
+                        latest = max(latest, comment["updated_at"])
+                    click.echo(".", nl=False)
+
+                with connection:
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO commenter (full_name, login) VALUES (?, ?)",
+                        ((full_name, login) for login in logins),
+                    )
+                    if latest:
+                        connection.execute(
+                            "INSERT OR REPLACE INTO repository (full_name, since) VALUES (?, ?)",
+                            (full_name, latest),
+                        )
                 logins.update(
-                    comment["user"]["login"]
-                    for comment in response.json()
-                    if not comment["user"]["login"].endswith("[bot]")
+                    login
+                    for (login,) in connection.execute("SELECT login FROM commenter WHERE full_name = ?", (full_name,))
                 )
-                url = response.links.get("next", {}).get("url")
-                click.echo(".", nl=False)
 
-        response = get(f"{repo['contributors_url']}?per_page=100")
-        if response.content:
-            logins.update(user["login"] for user in response.json() if not user["login"].endswith("[bot]"))
+            response = future.result()
+            if response.content:
+                logins.update(user["login"] for user in response.json() if not user["login"].endswith("[bot]"))
 
-        contributors_by_repository[repo["name"]] = logins
-        contributors.update(logins)
+            contributors_by_repository[repo["name"]] = logins
+            contributors.update(logins)
 
-        click.echo("")
+            click.echo("")
+
+    if commenters:
+        connection.close()
 
     if verbose:
         click.echo(json.dumps(contributors_by_repository, indent=2, default=default))
@@ -342,15 +608,20 @@ def github_contributors(organization, commenters, verbose):
 @click.option("--days", type=int, default=90, help="Days ago from which to count contributions")
 @click.option("--start", help="Datetime from which to count contributions")
 @click.option("--end", help="Datetime up to which to count contributions")
-def github_activity(user, days, start, end):
+# Each user requests up to 100 repositories. Larger batches risk GitHub's 10-second timeout.
+@click.option("--batch-size", type=int, default=10, help="Number of users per GraphQL query")
+@click.option("--workers", type=int, default=4, help="Maximum number of concurrent queries")
+def github_activity(user, days, start, end, batch_size, workers):
     """Report the number of contributions by users, per repository."""
+    max_repositories = 100
     format_string = """\
 query {{
 {queries}
 }}
 fragment f on User {{
     contributionsCollection(from: "{start}", to: "{end}") {{
-        commitContributionsByRepository(maxRepositories: 100) {{
+        totalCommitContributions
+        commitContributionsByRepository(maxRepositories: {max_repositories}) {{
             contributions {{
                 totalCount
             }}
@@ -372,26 +643,50 @@ fragment f on User {{
     if not end:
         end = datetime.datetime.now(tz=datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    query = format_string.format(
-        queries="\n".join(f'  user{i}: user(login: "{login}") {{\n    ...f\n  }}' for i, login in enumerate(user)),
-        start=start,
-        end=end,
-    )
+    def query(logins):
+        return post(
+            "https://api.github.com/graphql",
+            json={
+                "query": format_string.format(
+                    queries="\n".join(
+                        f'  user{i}: user(login: "{login}") {{\n    ...f\n  }}' for i, login in enumerate(logins)
+                    ),
+                    start=start,
+                    end=end,
+                    max_repositories=max_repositories,
+                )
+            },
+        ).json()
 
-    response = requests.post("https://api.github.com/graphql", json={"query": query}, timeout=10)
-    response.raise_for_status()
-    json = response.json()
-    if "errors" in json:
-        click.echo(json)
-        return
+    batches = [user[i : i + batch_size] for i in range(0, len(user), batch_size)]
 
     counter = defaultdict(int)
-    for data in response.json()["data"].values():
-        try:
-            for by in data["contributionsCollection"]["commitContributionsByRepository"]:
-                counter[by["repository"]["url"]] += by["contributions"]["totalCount"]
-        except KeyError:
-            click.echo(data)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Merge the batches in order, so that the output is deterministic.
+        for logins, json in zip(batches, executor.map(query, batches), strict=True):
+            if "errors" in json:
+                click.echo(json["errors"])
+
+            for i, login in enumerate(logins):
+                data = (json.get("data") or {}).get(f"user{i}")
+                try:
+                    collection = data["contributionsCollection"]
+                    by_repository = collection["commitContributionsByRepository"]
+                except (KeyError, TypeError):
+                    click.echo(f"{login}: {data}")
+                    continue
+
+                total = 0
+                for by in by_repository:
+                    counter[by["repository"]["url"]] += by["contributions"]["totalCount"]
+                    total += by["contributions"]["totalCount"]
+
+                if len(by_repository) == max_repositories or total < collection["totalCommitContributions"]:
+                    click.secho(
+                        f"{login}: results truncated to {len(by_repository)} repositories ({total} of "
+                        f"{collection['totalCommitContributions']} commit contributions)",
+                        fg="yellow",
+                    )
 
     click.echo("  R   C  URL")
     for i, (url, count) in enumerate(sorted(counter.items(), key=itemgetter(1), reverse=True), 1):
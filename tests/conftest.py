@@ -0,0 +1,19 @@
+import resource
+import sys
+
+from util import cache_stats, http_cache_summary, result_cache_summary, result_stats
+
+
+def pytest_terminal_summary(terminalreporter):
+    if cache_stats:
+        terminalreporter.write_sep("-", "HTTP cache")
+        terminalreporter.write_line(http_cache_summary())
+    if result_stats:
+        terminalreporter.write_sep("-", "Result cache")
+        for line in result_cache_summary():
+            terminalreporter.write_line(line)
+
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    terminalreporter.write_sep("-", "Memory")
+    terminalreporter.write_line(f"Peak RSS: {peak / 1024 / 1024:,.1f} MiB")
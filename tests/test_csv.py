@@ -1,16 +1,18 @@
+import codecs
 import csv
 import json
+import mmap
 import os
 import re
 import warnings
+from functools import cache, partial
 from io import StringIO
 
 import pytest
-import requests
 from jscc.schema import is_codelist
-from jscc.testing.filesystem import walk_csv_data
 from jsonschema import FormatChecker
 from jsonschema.validators import Draft4Validator as Validator
+from util import cached_check, file_digest, http_get, map_files, read_csv, walk
 
 cwd = os.getcwd()
 repo_name = os.path.basename(os.getenv("GITHUB_REPOSITORY", cwd))
@@ -24,26 +26,250 @@ warnings.formatwarning = formatwarning
 pytestmark = pytest.mark.filterwarnings("always")
 
 
-@pytest.mark.skipif(bool(os.getenv("OCDS_NO_CSV", "")), reason="skipped CSV validation")
-def test_valid():
+# The characters that `str.strip` removes, other than line terminators.
+whitespace = (
+    "\t\x0b\x0c\x1c\x1d\x1e\x1f \x85\xa0\u1680"
+    + "".join(map(chr, range(0x2000, 0x200B)))
+    + "\u2028\u2029\u202f\u205f\u3000"
+)
+whitespace_bytes = {character.encode() for character in whitespace}
+
+# Translate each byte to a class, to find whitespace at the start or end of a cell with `bytes.find`: "\n", "\r" and
+# "," are unchanged, " " is ASCII whitespace, "u" starts and "t" ends other whitespace in UTF-8, and "x" is other.
+byte_classes = bytearray(b"x" * 256)
+for character in b"\n\r,":
+    byte_classes[character] = character
+for encoded in whitespace_bytes:
+    if len(encoded) == 1:
+        byte_classes[encoded[0]] = ord(" ")
+    else:
+        byte_classes[encoded[0]] = ord("u")
+        byte_classes[encoded[-1]] = ord("t")
+byte_classes = bytes(byte_classes)
+# The pairs of byte classes in which the byte at the offset might be whitespace at the start or end of a cell.
+whitespace_pairs = [
+    *((boundary + character, 1) for boundary in (b"\n", b",") for character in (b" ", b"u")),
+    *((character + boundary, 0) for boundary in (b"\n", b"\r", b",") for character in (b" ", b"t")),
+]
+# The bytes other than "," and "\n".
+non_structure = bytes(character for character in range(256) if character not in b",\n")
+
+
+def scan_valid(path, chunk_size=1024 * 1024):
     """
-    Ensures all CSV files are valid: no empty rows or columns, no leading or trailing whitespace in cells, same number
-    of cells in each row.
+    Check a CSV file with byte-level searches of a memory map, one chunk at a time, and return the number of errors,
+    or ``None`` if the file needs :func:`_check_valid`.
+
+    The searches are enough if the file is UTF-8, has no quoting characters or lone carriage returns, has unique
+    headers, and has the same number of cells in each row, with no empty rows. In that case, each line is a row and the
+    formatted file is the same as the file, except for line terminators. The warnings are the same as
+    :func:`_check_valid`.
+    """
+    with open(path, newline="") as f:
+        if codecs.lookup(f.encoding).name != "utf-8":
+            return None
+
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with m:
+        size = len(m)
+        start = m.find(b"\n") + 1 or size  # the first data row
+        header = m[:start]
+        if b'"' in header or b"\x00" in header or header.count(b"\r") != header.count(b"\r\n"):
+            return None
+
+        fieldnames = header.decode().rstrip("\r\n").split(",")
+        width = len(fieldnames)
+        if width < 2 or len(set(fieldnames)) != width:
+            return None
+
+        def count(needle, begin, end):
+            return sum(m[i : min(i + chunk_size, end)].count(needle) for i in range(begin, end, chunk_size))
+
+        row = b"," * (width - 1) + b"\n"
+        empty_rows = [b"\n" + row, b"\n" + row[:-1] + b"\r"]
+        overlap = width + 1
+        # The partial line at the end of the previous chunk, without bytes other than "," and "\n".
+        carry = b""
+        # The positions of whitespace at the start or end of a cell.
+        positions = []
+
+        for offset in range(start, size, chunk_size):
+            chunk = m[offset : offset + chunk_size]
+            following = m[offset + chunk_size : offset + chunk_size + 1]
+            if (
+                b'"' in chunk
+                or b"\x00" in chunk
+                or chunk.count(b"\r") != chunk.count(b"\r\n") + (chunk.endswith(b"\r") and following == b"\n")
+            ):
+                return None
+
+            # Each line must have `width` cells.
+            skeleton = carry + chunk.translate(None, non_structure)
+            lines, newline, carry = skeleton.rpartition(b"\n")
+            if lines + newline != row * skeleton.count(b"\n") or len(carry) >= width:
+                return None
+
+            # Search the end of the previous chunk, for matches that end in this chunk.
+            window_start = max(offset - overlap, start - 1)
+            classes = m[window_start : offset + chunk_size].translate(byte_classes)
+            if not following:
+                classes += b"\n"  # the end of the file ends the last cell
+
+            for empty_row in empty_rows:
+                position = classes.find(empty_row)
+                if position != -1:
+                    return None
+
+            for pair, index in whitespace_pairs:
+                position = classes.find(pair)
+                while position != -1:
+                    if window_start + position + 1 >= offset:
+                        positions.append(window_start + position + index)
+                    position = classes.find(pair, position + 1)
+
+        # The last line might not end in "\n".
+        if start < size and m[-1:] != b"\n" and len(carry) != width - 1:
+            return None
+
+        errors = 0
+
+        def line_at(position):
+            line_start = m.rfind(b"\n", 0, position) + 1
+            line_end = m.find(b"\n", position)
+            return line_start, size if line_end == -1 else line_end + 1
+
+        row_index = 1
+        counted = 0
+        reported = None
+        for position in sorted(positions):
+            # Check that a "u" or "t" byte starts or ends whitespace.
+            if m[position] >= 0x80 and not any(
+                m[position : position + n] in whitespace_bytes
+                or m[position - n + 1 : position + 1] in whitespace_bytes
+                for n in (2, 3)
+            ):
+                continue
+
+            row_index += count(b"\n", counted, position)
+            counted = position
+            line_start, line_end = line_at(position)
+            col_index = m[line_start:position].count(b",") + 1
+            if (row_index, col_index) == reported:  # leading and trailing whitespace
+                continue
+            reported = (row_index, col_index)
+
+            cell_start = m.rfind(b",", line_start, position) + 1 or line_start
+            cell_end = m.find(b",", position, line_end)
+            if cell_end == -1:
+                cell_end = line_end - (m[line_end - 2 : line_end] == b"\r\n") - (m[line_end - 1 : line_end] == b"\n")
+            value = m[cell_start:cell_end].decode()
+            errors += 1
+            warnings.warn(
+                f'ERROR: {path} {fieldnames[col_index - 1]} "{value}" has leading or trailing whitespace at '
+                f"{row_index},{col_index}"
+            )
+
+        if start < size and is_codelist(fieldnames):
+            for col_index in range(1, width + 1):
+                nonempty = re.compile(rb"^" + rb"[^,\r\n]*," * (col_index - 1) + rb"[^,\r\n]", re.MULTILINE)
+                if not nonempty.search(m, start):
+                    errors += 1
+                    warnings.warn(f"ERROR: {path} has empty column {col_index}")
+
+        # The formatted file differs at the first line that ends in "\r\n", or at a last line without "\n".
+        if repo_name != "sample-data":
+            position = m.find(b"\r\n")
+            if position == -1 and m[-1:] != b"\n":
+                position = size - 1
+            if position != -1:
+                line_start, line_end = line_at(position)
+                row_index = count(b"\n", 0, line_start) + 1
+                actual = m[line_start:line_end].decode()
+                expected = actual.rstrip("\r\n") + "\n"
+                errors += 1
+                warnings.warn(
+                    f"ERROR: {path} is improperly formatted (e.g. missing trailing newline, extra quoting "
+                    f'characters, non-"\\n" line terminator) at row {row_index}:\n{actual!r}\n{expected!r}'
+                )
+
+    return errors
+
+
+def check_valid(path):
+    """
+    Check a CSV file one row at a time, and return the number of errors.
     """
+    errors = scan_valid(path)
+    if errors is not None:
+        return errors
+
+    try:
+        # Like `walk_csv_data`, skip files that aren't valid CSV.
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            errors = _check_valid(path)
+    except csv.Error:
+        return 0
+
+    for warning in caught:
+        warnings.warn(warning.message, warning.category, stacklevel=2)
+    return errors
+
+
+def _check_valid(path):
     errors = 0
 
-    excluded = (".git", ".ve", ".venv", "_static", "build", "fixtures", "node_modules")
-    for path, _, text, fieldnames, rows in walk_csv_data(excluded=excluded):
+    with open(path, newline="") as f:
+        # The lines of the rows read since the last formatting check.
+        source = []
+
+        def lines():
+            for line in f:
+                source.append(line)
+                yield line
+
+        reader = csv.DictReader(lines())
+        fieldnames = reader.fieldnames
+        if fieldnames is None:  # empty file
+            return errors
+
         codelist = is_codelist(fieldnames)
         width = len(fieldnames)
+        # Whether each column has a non-empty cell.
         columns = []
 
+        output = StringIO()
+        writer = csv.DictWriter(output, fieldnames=fieldnames, lineterminator="\n", extrasaction="ignore")
+        # The first difference between the file and its formatted rows, if any.
+        difference = None
+
+        def check_format(row_index, write, *args):
+            nonlocal difference
+            if difference is None and repo_name != "sample-data":
+                output.seek(0)
+                output.truncate()
+                write(*args)
+                actual = "".join(source)
+                expected = output.getvalue()
+                if actual != expected:
+                    difference = (row_index, actual, expected)
+            source.clear()
+
+        check_format(1, writer.writeheader)
+
         duplicates = len(fieldnames) - len(set(fieldnames))
         if duplicates:
             errors += 1
             warnings.warn(f"ERROR: {path} has {duplicates} duplicate column headers")
 
-        for row_index, row in enumerate(rows, 2):
+        row_index = 1
+        for row_index, row in enumerate(reader, 2):
+            check_format(row_index, writer.writerow, row)
+
             expected = len([cell for cell in row.values() if cell is not None]) + duplicates
             if expected != width:
                 errors += 1
@@ -54,9 +280,10 @@ def test_valid():
             else:
                 for col_index, (header, cell) in enumerate(row.items(), 1):
                     if col_index > len(columns):
-                        columns.append([])
+                        columns.append(False)
 
-                    columns[col_index - 1].append(cell)
+                    if cell:
+                        columns[col_index - 1] = True
 
                     # Extra cells were added to a column with a `None` header.
                     for value in cell if header is None and isinstance(cell, list) else [cell]:
@@ -67,107 +294,261 @@ def test_valid():
                                 f"{row_index},{col_index}"
                             )
 
+        # Any lines after the last row, like blank lines.
+        if source:
+            check_format(row_index + 1, lambda: None)
+
         for col_index, column in enumerate(columns, 1):
-            if not any(column) and codelist:
+            if not column and codelist:
                 errors += 1
                 warnings.warn(f"ERROR: {path} has empty column {col_index}")
 
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=fieldnames, lineterminator="\n", extrasaction="ignore")
-        writer.writeheader()
-        writer.writerows(rows)
-        expected = output.getvalue()
+    if difference:
+        errors += 1
+        row_index, actual, expected = difference
+        warnings.warn(
+            f"ERROR: {path} is improperly formatted (e.g. missing trailing newline, extra quoting "
+            f'characters, non-"\\n" line terminator) at row {row_index}:\n{actual!r}\n{expected!r}'
+        )
 
-        if text != expected and repo_name != "sample-data":
-            errors += 1
-            warnings.warn(
-                f"ERROR: {path} is improperly formatted (e.g. missing trailing newline, extra quoting "
-                f'characters, non-"\\n" line terminator):\n{text!r}\n{expected!r}'
-            )
+    return errors
 
-    assert errors == 0, "One or more codelist CSV files are invalid. See warnings below."
+
+def valid_configuration():
+    return {"code": file_digest(__file__), "repo_name": repo_name}
 
 
 @pytest.mark.skipif(bool(os.getenv("OCDS_NO_CSV", "")), reason="skipped CSV validation")
-def test_codelist():
+def test_valid():
     """
-    Ensures all codelists files are valid against codelist-schema.json.
+    Ensures all CSV files are valid: no empty rows or columns, no leading or trailing whitespace in cells, same number
+    of cells in each row.
     """
-    exceptions = {
-        "currency.csv": "'Description' is a required property",
-        "language.csv": "'Description' is a required property",
-        "mediaType.csv": "'Description' is a required property",
-        # ocds_countryCode_extension
-        "country.csv": "'Description' is a required property",
-        # ocds_coveredBy_extension
-        "coveredBy.csv": "'Description' is a required property",
-        # ocds_eu_extension
-        "sources.csv": re.compile(" does not match "),  # copies EU
-        # ocds_medicine_extension
-        "administrationRoute.csv": "'Description' is a required property",
-        "dosageForm.csv": "None is not of type 'string'",  # copies HL7
-        "immediateContainer.csv": "None is not of type 'string'",  # copies HL7
-    }
-
-    array_columns = ("Framework", "Section")
+    paths = [path for path, _ in walk() if path.endswith(".csv")]
+    arguments = [
+        ("test_valid", path, partial(file_digest, path), valid_configuration, check_valid, path) for path in paths
+    ]
+    errors = sum(map_files(cached_check, arguments))
+
+    assert errors == 0, "One or more codelist CSV files are invalid. See warnings below."
+
+
+exceptions = {
+    "currency.csv": "'Description' is a required property",
+    "language.csv": "'Description' is a required property",
+    "mediaType.csv": "'Description' is a required property",
+    # ocds_countryCode_extension
+    "country.csv": "'Description' is a required property",
+    # ocds_coveredBy_extension
+    "coveredBy.csv": "'Description' is a required property",
+    # ocds_eu_extension
+    "sources.csv": re.compile(" does not match "),  # copies EU
+    # ocds_medicine_extension
+    "administrationRoute.csv": "'Description' is a required property",
+    "dosageForm.csv": "None is not of type 'string'",  # copies HL7
+    "immediateContainer.csv": "None is not of type 'string'",  # copies HL7
+}
+
+array_columns = ("Framework", "Section")
+
+minus_schema = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "type": "array",
+    "items": {
+        "type": "object",
+        "required": ["Code"],
+        "additionalProperties": False,
+        "properties": {
+            "Code": {
+                "title": "Code",
+                "description": "The value to use in OCDS data.",
+                "type": "string",
+                "pattern": "^[A-Za-z0-9-]*$",
+            }
+        },
+    },
+}
 
+
+json_types = {"array": list, "null": type(None), "object": dict, "string": str}
+
+
+@cache
+def get_codelist_schema():
     path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "schema", "codelist-schema.json")
     if os.path.isfile(path):
         with open(path) as f:
-            codelist_schema = json.load(f)
-    else:
-        url = "https://raw.githubusercontent.com/open-contracting/standard-maintenance-scripts/main/schema/codelist-schema.json"
-        codelist_schema = requests.get(url).json()
-
-    minus_schema = {
-        "$schema": "http://json-schema.org/draft-04/schema#",
-        "type": "array",
-        "items": {
-            "type": "object",
-            "required": ["Code"],
-            "additionalProperties": False,
-            "properties": {
-                "Code": {
-                    "title": "Code",
-                    "description": "The value to use in OCDS data.",
-                    "type": "string",
-                    "pattern": "^[A-Za-z0-9-]*$",
-                }
-            },
-        },
-    }
+            return json.load(f)
+    url = "https://raw.githubusercontent.com/open-contracting/standard-maintenance-scripts/main/schema/codelist-schema.json"
+    return http_get(url).json()
+
+
+@cache
+def get_codelist_validator(*, minus=False):
+    """
+    Return a validator for the codelist schema (or for the schema of codelists that remove codes), and a function
+    that returns whether a row is valid, or ``None`` if :func:`compile_schema` doesn't support the schema.
+    """
+    schema = minus_schema if minus else get_codelist_schema()
+    validator = Validator(schema, format_checker=FormatChecker())
+    return validator, compile_schema(schema["items"], schema, validator.format_checker)
+
+
+def compile_schema(schema, root, format_checker):
+    """
+    Compile a JSON Schema into a function that returns whether a value is valid, like ``Draft4Validator.is_valid``.
+
+    Only the keywords that codelist schemas use are supported. If the schema uses another keyword, return ``None``.
+    """
+    if "$ref" in schema:  # Draft 4 ignores the other keywords
+        if not schema["$ref"].startswith("#/definitions/"):
+            return None
+        return compile_schema(root["definitions"][schema["$ref"][14:]], root, format_checker)
 
+    checks = []
+
+    for keyword, value in schema.items():
+        if keyword in {"$schema", "definitions", "description", "title"}:
+            continue
+
+        if keyword == "type":
+            types = value if isinstance(value, list) else [value]
+            if any(name not in json_types for name in types):
+                return None
+            classes = tuple(json_types[name] for name in types)
+            checks.append(lambda v, classes=classes: isinstance(v, classes))
+        elif keyword == "enum":
+            checks.append(lambda v, value=value: v in value)
+        elif keyword == "format":
+            if format_checker:
+                checks.append(lambda v, value=value: format_checker.conforms(v, value))
+        elif keyword == "oneOf":
+            subschemas = [compile_schema(subschema, root, format_checker) for subschema in value]
+            if None in subschemas:
+                return None
+            checks.append(lambda v, subschemas=subschemas: sum(check(v) for check in subschemas) == 1)
+        # String keywords.
+        elif keyword == "pattern":
+            search = re.compile(value).search
+            checks.append(lambda v, search=search: not isinstance(v, str) or search(v))
+        elif keyword == "minLength":
+            checks.append(lambda v, value=value: not isinstance(v, str) or len(v) >= value)
+        # Array keywords.
+        elif keyword == "minItems":
+            checks.append(lambda v, value=value: not isinstance(v, list) or len(v) >= value)
+        elif keyword == "uniqueItems":
+            if value:
+                checks.append(lambda v: not isinstance(v, list) or len(set(map(repr, v))) == len(v))
+        elif keyword == "items":
+            if not isinstance(value, dict) or (check := compile_schema(value, root, format_checker)) is None:
+                return None
+            checks.append(lambda v, check=check: not isinstance(v, list) or all(map(check, v)))
+        # Object keywords.
+        elif keyword == "required":
+            checks.append(lambda v, value=value: not isinstance(v, dict) or all(name in v for name in value))
+        elif keyword == "minProperties":
+            checks.append(lambda v, value=value: not isinstance(v, dict) or len(v) >= value)
+        elif keyword == "additionalProperties":
+            if not isinstance(value, bool) or "patternProperties" in schema:
+                return None
+            if not value:
+                names = set(schema.get("properties", {}))
+                checks.append(lambda v, names=names: not isinstance(v, dict) or names.issuperset(v))
+        elif keyword == "properties":
+            properties = {name: compile_schema(subschema, root, format_checker) for name, subschema in value.items()}
+            if None in properties.values():
+                return None
+            checks.append(
+                lambda v, properties=properties: (
+                    not isinstance(v, dict) or all(check(v[name]) for name, check in properties.items() if name in v)
+                )
+            )
+        else:
+            return None
+
+    return lambda v: all(check(v) for check in checks)
+
+
+def iter_codelist_errors(validator, is_valid_row, data):
+    """
+    Yield the same errors as ``validator.iter_errors(data)``.
+
+    Use the generic validator only for invalid rows, and for ``uniqueItems`` only if a row is repeated.
+    """
+    if is_valid_row is None:
+        yield from validator.iter_errors(data)
+        return
+
+    for keyword, value in validator.schema.items():
+        if keyword == "items":
+            for index, item in enumerate(data):
+                if not is_valid_row(item):
+                    yield from validator.descend(item, value, path=index, schema_path=keyword)
+        elif keyword == "uniqueItems":
+            # Cells are strings, lists of strings or None, which are equal if their representations are equal.
+            if value and len({frozenset(map(repr, item.items())) for item in data}) != len(data):
+                yield from validator.descend(data, {keyword: value})
+        elif keyword not in {"$schema", "definitions", "description", "title"}:
+            yield from validator.descend(data, {keyword: value})
+
+
+def check_codelist(path):
     any_errors = False
 
-    for path, _, _, fieldnames, rows in walk_csv_data():
-        codes_seen = set()
-        if is_codelist(fieldnames):
-            data = []
-            for row_index, row in enumerate(rows, 2):
-                code = row["Code"]
-                if code in codes_seen:
-                    any_errors = True
-                    warnings.warn(f'{path}: Duplicate code "{code}" on row {row_index}')
-                codes_seen.add(code)
-
-                item = {}
-                for k, v in row.items():
-                    if k in array_columns:
-                        item[k] = v.split(", ")
-                    elif k == "Code" or v:
-                        item[k] = v
-                    else:
-                        item[k] = None
-                data.append(item)
-
-            schema = minus_schema if os.path.basename(path).startswith("-") else codelist_schema
-
-            for error in Validator(schema, format_checker=FormatChecker()).iter_errors(data):
-                message = error.message
-                pattern = exceptions.get(os.path.basename(path))
-                is_regex = hasattr(pattern, "search")
-                if (is_regex and not pattern.search(message)) or (not is_regex and message != pattern):
-                    any_errors = True
-                    warnings.warn(f"{path}: {message} ({'/'.join(error.absolute_schema_path)})\n")
-
-    assert not any_errors
+    try:
+        _, fieldnames, rows = read_csv(path)
+    except csv.Error:
+        return any_errors
+    if not fieldnames or not is_codelist(fieldnames):
+        return any_errors
+
+    codes_seen = set()
+    data = []
+    for row_index, row in enumerate(rows, 2):
+        code = row["Code"]
+        if code in codes_seen:
+            any_errors = True
+            warnings.warn(f'{path}: Duplicate code "{code}" on row {row_index}')
+        codes_seen.add(code)
+
+        item = {}
+        for k, v in row.items():
+            if k in array_columns:
+                item[k] = v.split(", ")
+            elif k == "Code" or v:
+                item[k] = v
+            else:
+                item[k] = None
+        data.append(item)
+
+    validator, is_valid_row = get_codelist_validator(minus=os.path.basename(path).startswith("-"))
+
+    for error in iter_codelist_errors(validator, is_valid_row, data):
+        message = error.message
+        pattern = exceptions.get(os.path.basename(path))
+        is_regex = hasattr(pattern, "search")
+        if (is_regex and not pattern.search(message)) or (not is_regex and message != pattern):
+            any_errors = True
+            warnings.warn(f"{path}: {message} ({'/'.join(error.absolute_schema_path)})\n")
+
+    return any_errors
+
+
+def codelist_configuration():
+    return {"code": file_digest(__file__), "codelist_schema": get_codelist_schema()}
+
+
+@pytest.mark.skipif(bool(os.getenv("OCDS_NO_CSV", "")), reason="skipped CSV validation")
+def test_codelist():
+    """
+    Ensures all codelists files are valid against codelist-schema.json.
+    """
+    paths = [path for path, _ in walk() if path.endswith(".csv")]
+    arguments = [
+        ("test_codelist", path, partial(file_digest, path), codelist_configuration, check_codelist, path)
+        for path in paths
+    ]
+    # Check all files, before asserting.
+    results = list(map_files(cached_check, arguments))
+
+    assert not any(results)
@@ -1,48 +1,69 @@
-import io
+import hashlib
 import json
 import os
 import re
 import warnings
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from functools import lru_cache
+from functools import lru_cache, partial
+from urllib.parse import urldefrag, urlsplit
 
 import jsonref
 import pytest
 import requests
-from jscc.exceptions import DeepPropertiesWarning
-from jscc.schema import extend_schema, is_json_merge_patch, is_json_schema, rejecting_dict
-from jscc.testing.checks import (
-    get_empty_files,
-    get_invalid_json_files,
-    get_misindented_files,
-    validate_array_items,
-    validate_codelist_enum,
-    validate_deep_properties,
-    validate_items_type,
-    validate_letter_case,
-    validate_merge_properties,
-    validate_metadata_presence,
-    validate_null_type,
-    validate_object_id,
-    validate_ref,
-    validate_schema,
-    validate_schema_codelists_match,
+from jscc.exceptions import (
+    CodelistEnumWarning,
+    DeepPropertiesWarning,
+    ItemsTypeWarning,
+    LetterCaseWarning,
+    MergePropertiesWarning,
+    MetadataPresenceWarning,
+    NullTypeWarning,
+    RefWarning,
+    SchemaCodelistsMatchWarning,
+)
+from jscc.schema import (
+    get_types,
+    is_array_of_objects,
+    is_json_merge_patch,
+    is_json_schema,
+    is_missing_property,
+    rejecting_dict,
 )
-from jscc.testing.filesystem import walk_csv_data, walk_json_data
-from jscc.testing.util import difference, http_get, http_head, warn_and_assert
+from jscc.testing.checks import validate_object_id, validate_schema
+from jscc.testing.util import difference, warn_and_assert
 from jsonschema import FormatChecker
 from jsonschema.validators import Draft4Validator, Draft202012Validator
 from ocdskit.schema import add_validation_properties
+from util import (
+    cache_dir,
+    cached_check,
+    extend_schema,
+    file_digest,
+    get_codelist,
+    get_codelists,
+    get_empty_files,
+    get_invalid_json_files,
+    get_misindented_files,
+    get_standard_codelists,
+    http_get,
+    prefetch_dependencies,
+    read_json,
+    standard_branches,
+    walk,
+    walk_csv_data,
+    walk_json_data,
+    write_atomic,
+)
+
+
+@lru_cache
+def get_external_codelists():
+    """
+    Return the basenames of the standard's codelist CSV files on its development branches.
+    """
+    return {name for ref in standard_branches for name in get_standard_codelists(ref)}
 
-external_codelists = set()
-for version in ("1.1", "1.2"):
-    response = requests.get(f"https://codeload.github.com/open-contracting/standard/zip/{version}-dev")
-    response.raise_for_status()
-    with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-        external_codelists |= {
-            os.path.basename(name) for name in z.namelist() if "codelists/" in name and name.endswith(".csv")
-        }
 
 # https://github.com/open-contracting/extension_registry/blob/main/extensions.csv
 core_extensions = {
@@ -131,66 +152,150 @@ warnings.warn(
 )
 
 
+released_tags = frozenset(ocds_tags)
+if ocds_version or not use_development_version:
+    unreleased_tag_pattern = re.compile(r"(\d+__\d+__\d+)")
+    unreleased_tag_replacement = ocds_tag
+else:
+    unreleased_tag_pattern = re.compile(re.escape(ocds_schema_base_url) + r"(\d+__\d+__\d+)")
+    unreleased_tag_replacement = development_base_url
+
+
+def replace_unreleased_tag(match):
+    return match.group(0) if match.group(1) in released_tags else unreleased_tag_replacement
+
+
 def patch(text):
     """
     Handle unreleased tag in $ref.
     """
-    for tag in re.findall(r"\d+__\d+__\d+", text):
-        if tag not in ocds_tags:
-            if ocds_version or not use_development_version:
-                text = text.replace(tag, ocds_tag)
-            else:
-                text = text.replace(ocds_schema_base_url + tag, development_base_url)
-    return text
+    if "__" not in text:
+        return text
+    return unreleased_tag_pattern.sub(replace_unreleased_tag, text)
 
 
-excluded = (".git", ".ve", ".venv", "_static", "build", "fixtures", "node_modules")
+# Only paths are collected, to not hold every schema in memory. Tests read the files that they need.
 json_schemas = [
-    (path, name, text, data)
-    for path, name, text, data in walk_json_data(patch, excluded=excluded)
-    if is_json_schema(data) and name != "biome.json"
+    (path, name) for path, name, _, data in walk_json_data(patch) if is_json_schema(data) and name != "biome.json"
 ]
 
 
-def loader(url, **kwargs):
+@lru_cache
+def load_document(url):
     if is_ocds and url.startswith("https://standard.open-contracting.org/schema/"):
-        with open(os.path.join(cwd, "schema", url.rsplit("/", 1)[1])) as f:
-            return json.load(f)
-    return jsonref.jsonloader(url, **kwargs)
+        return read_json(os.path.join(cwd, "schema", url.rsplit("/", 1)[1]))[1]
+    if urlsplit(url).scheme in {"http", "https"}:
+        return http_get(url).json()
+    return jsonref.jsonloader(url)
 
 
-def merge(*objs):
+def loader(url, **kwargs):
     """
-    Copied from json_merge_patch.
+    Return the document at the URL. Documents are cached by URL. jsonref doesn't modify the documents it loads.
     """
-    result = objs[0]
-    for obj in objs[1:]:
-        result = _merge_obj(result, obj)
-    return result
+    return load_document(url)
 
 
-def _merge_obj(result, obj, pointer=""):  # changed code
+def iter_urls(data):
     """
-    Copied from json_merge_patch, with edits to raise an error if overwriting.
+    Yield the URLs of the remote documents that the data references.
     """
-    if not isinstance(result, dict):
-        result = {}
+    if isinstance(data, list):
+        for item in data:
+            yield from iter_urls(item)
+    elif isinstance(data, dict):
+        if isinstance(data.get("$ref"), str):
+            url = urldefrag(data["$ref"]).url
+            if urlsplit(url).scheme in {"http", "https"}:
+                yield url
+        for value in data.values():
+            yield from iter_urls(value)
+
 
+@lru_cache
+def prefetch_documents():
+    """
+    Load the distinct remote documents that the JSON Schema files reference, concurrently.
+    """
+    urls = {url for path, _ in json_schemas for url in iter_urls(read_json(path, patch)[1])}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # Errors are raised when the reference is resolved.
+        for future in [executor.submit(load_document, url) for url in urls]:
+            future.exception()
+
+
+dereferenced = {}
+# The number of dereferenced schemas to keep, to bound memory use.
+dereferenced_size = 8
+
+
+def dereference(data):
+    """
+    Return the schema with all references resolved, or the error if a reference can't be resolved.
+
+    Results are cached by the hash of the schema's content, to share them between checks and between files.
+    """
+    prefetch_documents()
+
+    key = hashlib.sha256(json.dumps(data).encode()).hexdigest()
+    if key not in dereferenced:
+        if len(dereferenced) >= dereferenced_size:
+            del dereferenced[next(iter(dereferenced))]
+        try:
+            dereferenced[key] = jsonref.replace_refs(data, loader=loader, lazy_load=False)
+        except jsonref.JsonRefError as e:
+            dereferenced[key] = e
+    return dereferenced[key]
+
+
+def validate_ref(path, data):
+    """
+    Copied from jscc.testing.checks, to use :func:`dereference`.
+    """
+    result = dereference(data)
+    if isinstance(result, jsonref.JsonRefError):
+        warnings.warn(f"{path} has {result.message} at {'/'.join(map(str, result.path))}", RefWarning)
+        return 1
+
+    return 0
+
+
+def merge(document, patch):
+    """
+    Return the result of applying the JSON Merge Patch to the document, and whether the document changed.
+
+    Unlike json_merge_patch, the document isn't modified: unchanged objects are shared with the result.
+    """
+    return _merge_obj(document, patch)
+
+
+def _merge_obj(result, obj, keys=()):  # changed code
+    """
+    Copied from json_merge_patch, with edits to raise an error if overwriting, to copy objects only if they change,
+    and to return whether the result changed.
+    """
     if not isinstance(obj, dict):
-        return obj
+        return obj, obj != result  # changed code
+
+    original = result  # new code
+    if not isinstance(result, dict):
+        result = {}
 
     for key, value in obj.items():
         if isinstance(value, dict):
             target = result.get(key)
-            if isinstance(target, dict):
-                _merge_obj(target, value, pointer=f"{pointer}/{key}")  # changed code
-                continue
-            result[key] = {}
-            _merge_obj(result[key], value, pointer=f"{pointer}/{key}")  # changed code
+            # changed code
+            merged, changed = _merge_obj(target if isinstance(target, dict) else {}, value, keys=(*keys, key))
+            if changed or not isinstance(target, dict):
+                if result is original:
+                    result = result.copy()
+                result[key] = merged
             continue
 
         # new code
         if key in result:
+            pointer = "".join(f"/{k}" for k in keys)
             pointer_and_key = f"{pointer}/{key}"
             # Exceptions.
             if (
@@ -236,15 +341,20 @@ def _merge_obj(result, obj, pointer=""):  # changed code
                     message = ""
                 raise AssertionError(f"unexpectedly overwrites {pointer_and_key}{message}")
 
+        # changed code
         if value is None:
-            result.pop(key, None)
-            continue
-        result[key] = value
-    return result
-
-
-@lru_cache
-def metaschemas():
+            if key in result:
+                if result is original:
+                    result = result.copy()
+                del result[key]
+        elif key not in result or result[key] != value:
+            if result is original:
+                result = result.copy()
+            result[key] = value
+    return result, result is not original
+
+
+def derive_metaschemas(metaschema):
     # Novel uses of JSON Schema features may require updates to other repositories.
     # See https://ocds-standard-development-handbook.readthedocs.io/en/latest/meta/schema_style_guide.html#validation-keywords
     unused_json_schema_properties = {
@@ -266,9 +376,6 @@ def metaschemas():
         "not",
     }
 
-    url = "https://raw.githubusercontent.com/open-contracting/standard/1.1/schema/meta-schema.json"
-    metaschema = http_get(url).json()
-
     # Draft 6 removes `minItems` from `definitions/stringArray`.
     # See https://github.com/open-contracting-extensions/ocds_api_extension/blob/master/release-package-schema.json#L2
     del metaschema["definitions"]["stringArray"]["minItems"]
@@ -335,6 +442,42 @@ def metaschemas():
     }
 
 
+@lru_cache
+def metaschemas():
+    """
+    Return the metaschemas derived from the standard's metaschema.
+
+    The derived metaschemas are stored in the cache directory, keyed by the hash of the standard's metaschema, of this
+    file (which derives them) and of whether this is an extension.
+    """
+    response = http_get("https://raw.githubusercontent.com/open-contracting/standard/1.1/schema/meta-schema.json")
+    with open(__file__, "rb") as f:
+        key = hashlib.sha256(response.content + f.read() + str(is_extension).encode()).hexdigest()
+    path = os.path.join(cache_dir, "metaschemas", f"{key}.json")
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        schemas = derive_metaschemas(response.json())
+        write_atomic(path, json.dumps(schemas).encode())
+        return schemas
+
+
+validators = {}
+
+
+def get_validator(schema, validator_cls):
+    """
+    Return a validator for the schema, reusing the validator for the same schema object and validator class.
+    """
+    key = (id(schema), validator_cls)
+    if key not in validators:
+        # Keep a reference to the schema, so that its id() isn't reused.
+        validators[key] = (schema, validator_cls(schema, format_checker=FormatChecker()))
+    return validators[key][1]
+
+
 def test_empty():
     def include(path, name):
         return name not in {".gitkeep", "py.typed"} and (
@@ -367,12 +510,350 @@ def test_indent():
 
 def test_json_valid():
     warn_and_assert(
-        get_invalid_json_files(excluded=excluded),
+        get_invalid_json_files(),
         "{0} is not valid JSON: {1}",
         "JSON files are invalid. See warnings below.",
     )
 
 
+# The *_block functions are copied from the jscc.testing.checks.validate_* functions, to test one object in a JSON
+# Schema, so that all checks run in one traversal.
+
+
+def array_items_block(path, data, pointer, *, allow_invalid=()):
+    """
+    Copied from jscc.testing.checks.validate_array_items, to run as a block.
+    """
+    errors = 0
+
+    if "type" in data and "array" in data["type"] and "items" not in data and pointer not in allow_invalid:
+        errors += 1
+        warnings.warn(f'{path} is missing "items" at {pointer}', DeepPropertiesWarning)
+
+    return errors
+
+
+def items_type_block(path, data, pointer, *, additional_valid_types=None, allow_invalid=()):
+    """
+    Copied from jscc.testing.checks.validate_items_type, to run as a block.
+    """
+    errors = 0
+
+    valid_types = {"array", "number", "string"}
+    if additional_valid_types:
+        valid_types.update(additional_valid_types)
+
+    parent = pointer.rsplit("/", 1)[-1]
+
+    if parent == "items":
+        for _type in get_types(data):
+            if _type not in valid_types and pointer not in allow_invalid:
+                errors += 1
+                warnings.warn(f'{path} includes "{_type}" in "items/type" at {pointer}', ItemsTypeWarning)
+
+    return errors
+
+
+def letter_case_block(path, data, pointer, *, property_exceptions=(), definition_exceptions=()):
+    """
+    Copied from jscc.testing.checks.validate_letter_case, to run as a block.
+    """
+    errors = 0
+
+    parent = pointer.rsplit("/", 1)[-1]
+
+    if parent == "properties":
+        for key in data:
+            if not re.search(r"^[a-z][A-Za-z]+$", key) and key not in property_exceptions:
+                errors += 1
+                warnings.warn(f"{path}: {pointer}/{key} field isn't lowerCamelCase ASCII letters", LetterCaseWarning)
+    elif parent in {"definitions", "$defs"}:
+        for key in data:
+            if not re.search(r"^[A-Z][A-Za-z]+$", key) and key not in definition_exceptions:
+                errors += 1
+                warnings.warn(f"{path}: {pointer}/{key} block isn't UpperCamelCase ASCII letters", LetterCaseWarning)
+
+    return errors
+
+
+def merge_properties_block(path, data, pointer):
+    """
+    Copied from jscc.testing.checks.validate_merge_properties, to run as a block.
+    """
+    errors = 0
+
+    if "omitWhenMerged" in data and not data["omitWhenMerged"]:
+        errors += 1
+        warnings.warn(f'{path} sets "omitWhenMerged" to false or null at {pointer}', MergePropertiesWarning)
+    if "wholeListMerge" in data and not data["wholeListMerge"]:
+        errors += 1
+        warnings.warn(f'{path} sets "wholeListMerge" to false or null at {pointer}', MergePropertiesWarning)
+    elif "wholeListMerge" in data:
+        if not is_array_of_objects(data):
+            errors += 1
+            warnings.warn(
+                f'{path} sets "wholeListMerge", though the field is not an array of objects, at {pointer}',
+                MergePropertiesWarning,
+            )
+        if "omitWhenMerged" in data:
+            errors += 1
+            warnings.warn(
+                f'{path} sets both "omitWhenMerged" and "wholeListMerge" at {pointer}', MergePropertiesWarning
+            )
+
+    return errors
+
+
+def metadata_presence_block(path, data, pointer, *, allow_missing=None):
+    """
+    Copied from jscc.testing.checks.validate_metadata_presence, to run as a block.
+    """
+    errors = 0
+
+    parts = pointer.rsplit("/")
+    grandparent = parts[-2] if len(parts) >= 3 else None
+    parent = parts[-1]
+
+    # Look for metadata fields on user-defined objects only. (Add exceptional condition for "items" field.)
+    if (
+        parent not in {"definitions", "$defs", "deprecated", "items", "patternProperties", "properties"}
+        and grandparent != "patternProperties"
+    ) or grandparent == "properties":
+        for prop in ("title", "description"):
+            # If a field has `$ref`, then its `title` and `description` might defer to the reference.
+            if (
+                is_missing_property(data, prop)
+                and "$ref" not in data
+                and not (allow_missing and allow_missing(pointer))
+            ):
+                errors += 1
+                warnings.warn(f'{path} is missing "{prop}" at {pointer}', MetadataPresenceWarning)
+
+        if (
+            "type" not in data
+            and "$ref" not in data
+            and "oneOf" not in data
+            and not (allow_missing and allow_missing(pointer))
+        ):
+            errors += 1
+            warnings.warn(f'{path} is missing "type" or "$ref" or "oneOf" at {pointer}', MetadataPresenceWarning)
+
+    return errors
+
+
+def deep_properties_block(path, data, pointer, *, allow_deep=()):
+    """
+    Copied from jscc.testing.checks.validate_deep_properties, to run as a block.
+    """
+    errors = 0
+
+    parts = pointer.rsplit("/", 2)
+    grandparent = parts[-2] if len(parts) == 3 else None
+
+    if pointer and grandparent not in {"definitions", "$defs"} and "properties" in data and pointer not in allow_deep:
+        errors += 1
+        warnings.warn(f'{path} has "properties" within "properties" at {pointer}', DeepPropertiesWarning)
+
+    return errors
+
+
+def null_type_block(
+    path, data, pointer, expect_null, *, no_null=False, allow_object_null=(), allow_no_null=(), allow_null=()
+):
+    """
+    Copied from jscc.testing.checks.validate_null_type, to run as a block.
+    """
+    errors = 0
+
+    if no_null:
+        expect_null = False
+
+    if "type" in data and pointer:
+        null_in_type = "null" in data["type"]
+        null_not_allowed = "object" in data["type"] or is_array_of_objects(data)
+        # Objects and arrays of objects mustn't be nullable.
+        if null_in_type and null_not_allowed and pointer not in allow_object_null:
+            errors += 1
+            warnings.warn(f'{path} includes "null" in "type" at {pointer}', NullTypeWarning)
+        elif expect_null:
+            if not null_in_type and not null_not_allowed and pointer not in allow_no_null:
+                errors += 1
+                warnings.warn(f'{path} is missing "null" in "type" at {pointer}', NullTypeWarning)
+        elif null_in_type and pointer not in allow_null:
+            errors += 1
+            warnings.warn(f'{path} includes "null" in "type" at {pointer}', NullTypeWarning)
+
+    return errors
+
+
+def codelist_enum_block(path, data, pointer, *, fallback=None, allow_enum=None, allow_missing=None):
+    """
+    Copied from jscc.testing.checks.validate_codelist_enum, to run as a block, and to read codes from the codelist
+    index, instead of reading all CSV files for each closed codelist.
+    """
+    errors = 0
+
+    parent = pointer.rsplit("/", 1)[-1]
+
+    if "codelist" in data:
+        # `type` can be missing if changing an existing property.
+        types = get_types(data) if "type" in data else (fallback or {}).get(pointer, ["array"])
+
+        if data["openCodelist"]:
+            if ("string" in types and "enum" in data) or ("array" in types and "enum" in data["items"]):
+                errors += 1
+                warnings.warn(f'{path} sets "enum", though "openCodelist" is true, at {pointer}', CodelistEnumWarning)
+        else:
+            if ("string" in types and "enum" not in data) or ("array" in types and "enum" not in data["items"]):
+                errors += 1
+                warnings.warn(
+                    f'{path} is missing "enum", though "openCodelist" is false, at {pointer}', CodelistEnumWarning
+                )
+                actual = None
+            elif "string" in types:
+                actual = set(data["enum"])
+            else:
+                actual = set(data["items"]["enum"])
+
+            # The codelist's CSV file must exist.
+            codelist = get_codelist(data["codelist"])
+            if codelist is not None:
+                if actual:
+                    expected = set(codelist["codes"])
+                    if "string" in types and "null" in types:
+                        expected.add(None)
+
+                    if actual != expected:
+                        added, removed = difference(actual, expected)
+
+                        errors += 1
+                        warnings.warn(
+                            f"{path}: {pointer}/enum doesn't match codelists/{data['codelist']}{added}{removed}",
+                            CodelistEnumWarning,
+                        )
+            # When validating a patched schema, the core codelists are missing from an extension, which isn't an error.
+            elif not (allow_missing and allow_missing(data["codelist"])):
+                errors += 1
+                warnings.warn(
+                    f"{path} refers to missing file codelists/{data['codelist']} at {pointer}", CodelistEnumWarning
+                )
+    elif ("enum" in data and parent != "items") or ("items" in data and "enum" in data["items"]):
+        if not (allow_enum and allow_enum(pointer)):
+            errors += 1
+            warnings.warn(f'{path} is missing "codelist" and "openCodelist" at {pointer}', CodelistEnumWarning)
+
+    return errors
+
+
+def validate_schema_codelists_match(path, data, top, *, is_extension=False, is_profile=False, external_codelists=None):
+    """
+    Copied from jscc.testing.checks.validate_schema_codelists_match, to read codelists from the codelist index.
+    """
+    if not external_codelists:
+        external_codelists = set()
+
+    def collect_codelist_values(data):
+        codelists = set()
+
+        if isinstance(data, list):
+            for item in data:
+                codelists.update(collect_codelist_values(item))
+        elif isinstance(data, dict):
+            if "codelist" in data:
+                codelists.add(data["codelist"])
+
+            for value in data.values():
+                codelists.update(collect_codelist_values(value))
+
+        return codelists
+
+    errors = 0
+
+    codelist_files = set()
+    for csvpath in get_codelists():
+        csvname = os.path.basename(csvpath)
+        parts = csvpath.replace(top, "").split(os.sep)  # maybe inelegant way to isolate consolidated extension
+        # Take all codelists in extensions, all codelists in core, and non-core codelists in profiles.
+        if (is_extension and not is_profile) or "patched" not in parts:
+            if csvname.startswith(("+", "-")):
+                if csvname[1:] not in external_codelists:
+                    errors += 1
+                    warnings.warn(f"{csvname} patches unknown codelist", SchemaCodelistsMatchWarning)
+            else:
+                codelist_files.add(csvname)
+
+    codelist_values = collect_codelist_values(data)
+    all_codelist_files = codelist_files | external_codelists if is_extension else codelist_files
+
+    unused_codelists = [codelist for codelist in codelist_files if codelist not in codelist_values]
+    missing_codelists = [codelist for codelist in codelist_values if codelist not in all_codelist_files]
+
+    if unused_codelists:
+        errors += 1
+        warnings.warn(f"unused codelists: {', '.join(sorted(unused_codelists))}", SchemaCodelistsMatchWarning)
+    if missing_codelists:
+        errors += 1
+        warnings.warn(f"missing codelists: {', '.join(sorted(missing_codelists))}", SchemaCodelistsMatchWarning)
+
+    return errors
+
+
+def traverse_schema(path, data, blocks, null_type_kwargs=None):
+    """
+    Run blocks on each object in a JSON Schema in one traversal, and return the number of errors and the warnings per
+    block. Call :func:`issue` with a block's result to issue its warnings, as if the block had traversed the schema.
+
+    If ``null_type_kwargs`` is set, ``validate_null_type`` runs as the last block.
+    """
+    size = len(blocks) + (null_type_kwargs is not None)
+    errors = [0] * size
+    messages = [[] for _ in range(size)]
+
+    def record(index, count):
+        errors[index] += count
+        messages[index].extend(caught)
+        caught.clear()
+
+    # `validate_null_type` doesn't test the objects under "properties", "definitions" and "$defs" keys, and expects
+    # "null" in the "type" of fields that aren't required. `expect_null_children` is set for these objects.
+    def visit(data, pointer="", *, expect_null=True, expect_null_children=None):
+        if isinstance(data, list):
+            for index, item in enumerate(data):
+                visit(item, f"{pointer}/{index}")
+        elif isinstance(data, dict):
+            for index, block in enumerate(blocks):
+                record(index, block(path, data, pointer))
+            if null_type_kwargs is not None and expect_null_children is None:
+                record(-1, null_type_block(path, data, pointer, expect_null, **null_type_kwargs))
+
+            required = data.get("required", [])
+
+            for key, value in data.items():
+                if expect_null_children is not None:
+                    visit(value, f"{pointer}/{key}", expect_null=expect_null_children[key])
+                elif key in {"properties", "definitions", "$defs"} and isinstance(value, dict):
+                    children = {k: key == "properties" and k not in required for k in value}
+                    visit(value, f"{pointer}/{key}", expect_null_children=children)
+                else:
+                    visit(value, f"{pointer}/{key}", expect_null=key != "items")
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        visit(data)
+
+    return list(zip(errors, messages, strict=True))
+
+
+def issue(result):
+    """
+    Issue the warnings of a block's result from :func:`traverse_schema`, and return its number of errors.
+    """
+    errors, messages = result
+    for message in messages:
+        warnings.warn(message.message, message.category)
+    return errors
+
+
 def validate_json_schema(path, name, data, schema, *, validator_cls=Draft4Validator, full_schema=not is_extension):
     """
     Prints and asserts errors in a JSON Schema.
@@ -409,7 +890,7 @@ def validate_json_schema(path, name, data, schema, *, validator_cls=Draft4Valida
     }
 
     def validate_codelist_enum_allow_missing(codelist):
-        return is_extension and codelist in external_codelists
+        return is_extension and codelist in get_external_codelists()
 
     validate_codelist_enum_kwargs = {
         "fallback": {
@@ -502,20 +983,26 @@ def validate_json_schema(path, name, data, schema, *, validator_cls=Draft4Valida
     if is_extension:  # avoid repetition in extensions
         validate_deep_properties_kwargs["allow_deep"].add("/definitions/Item/properties/unit")
 
-    validator = validator_cls(schema, format_checker=FormatChecker())
+    validator = get_validator(schema, validator_cls)
 
     errors += validate_schema(path, data, validator)
     if errors:
         warnings.warn(f"{path} is not valid against the schema ({errors} errors)")
 
+    # The checks that test each object in the schema are run in one traversal. Their warnings are issued in the same
+    # order as if each check had traversed the schema in turn.
+    blocks = []
+    null_type_kwargs = None
+
     if name not in schema_exceptions:
         if "versioned-release-validation-schema.json" in path:
             validate_items_type_kwargs["additional_valid_types"] = ["object"]
-        errors += validate_array_items(path, data, **validate_array_items_kwargs)
-        errors += validate_items_type(path, data, **validate_items_type_kwargs)
-        errors += validate_codelist_enum(path, data, **validate_codelist_enum_kwargs)
-        errors += validate_letter_case(path, data, **validate_letter_case_kwargs)
-        errors += validate_merge_properties(path, data)
+        blocks.append(partial(array_items_block, **validate_array_items_kwargs))
+        blocks.append(partial(items_type_block, **validate_items_type_kwargs))
+        blocks.append(partial(codelist_enum_block, **validate_codelist_enum_kwargs))
+        blocks.append(partial(letter_case_block, **validate_letter_case_kwargs))
+        blocks.append(merge_properties_block)
+    core = len(blocks)
 
     # `full_schema` is set to not expect extensions to repeat information from core.
     if full_schema:
@@ -533,18 +1020,30 @@ def validate_json_schema(path, name, data, schema, *, validator_cls=Draft4Valida
             "record-schema.json",
         }
 
-        # Extensions aren't expected to repeat referenced `definitions`.
-        errors += validate_ref(path, data, loader=loader)
-
         if name not in exceptions_plus_versioned:
             # Extensions aren't expected to repeat `title`, `description`, `type`.
-            errors += validate_metadata_presence(path, data, **validate_metadata_presence_kwargs)
-            # Extensions aren't expected to repeat referenced `definitions`.
-            errors += validate_object_id(path, jsonref.replace_refs(data, loader=loader), **validate_object_id_kwargs)
+            blocks.append(partial(metadata_presence_block, **validate_metadata_presence_kwargs))
 
         if name not in exceptions_plus_versioned_and_packages:
             # Extensions aren't expected to repeat `required`. Packages don't have merge rules.
-            errors += validate_null_type(path, data, **validate_null_type_kwargs)
+            null_type_kwargs = validate_null_type_kwargs
+
+        results = traverse_schema(path, data, blocks, null_type_kwargs)
+        errors += sum(map(issue, results[:core]))
+
+        # Extensions aren't expected to repeat referenced `definitions`.
+        errors += validate_ref(path, data)
+
+        if name not in exceptions_plus_versioned:
+            errors += issue(results[core])
+            # Extensions aren't expected to repeat referenced `definitions`.
+            result = dereference(data)
+            if isinstance(result, jsonref.JsonRefError):
+                result = jsonref.replace_refs(data, loader=loader)
+            errors += validate_object_id(path, result, **validate_object_id_kwargs)
+
+        if null_type_kwargs is not None:
+            errors += issue(results[-1])
 
         if name not in exceptions_plus_versioned_and_packages_and_record:
             # Extensions aren't expected to repeat referenced codelist CSV files.
@@ -555,22 +1054,80 @@ def validate_json_schema(path, name, data, schema, *, validator_cls=Draft4Valida
                 cwd,
                 is_extension=is_extension,
                 is_profile=is_profile,
-                external_codelists=external_codelists,
+                external_codelists=get_external_codelists(),
             )
 
     else:
+        blocks.append(partial(deep_properties_block, **validate_deep_properties_kwargs))
+        results = traverse_schema(path, data, blocks)
+        errors += sum(map(issue, results[:-1]))
         # Don't count these as errors.
-        validate_deep_properties(path, data, **validate_deep_properties_kwargs)
+        issue(results[-1])
 
     assert not errors, "One or more JSON Schema files are invalid. See warnings below."
 
 
-@pytest.mark.parametrize(("path", "name", "text", "data"), json_schemas)
-def test_schema_valid(path, name, text, data):
+@lru_cache
+def get_result_configuration():
+    """
+    Return the inputs to ``validate_json_schema``, other than the file and the metaschema, to key cached results.
+    """
+    return {
+        "code": file_digest(__file__),
+        "environment": {
+            key: os.getenv(key)
+            for key in (
+                "GITHUB_BASE_REF",
+                "GITHUB_HEAD_REF",
+                "GITHUB_REF_NAME",
+                "GITHUB_REPOSITORY",
+                "OCDS_DISALLOW_NULL",
+                "OCDS_EXTENSION_PATHS",
+                "OCDS_SCHEMA_EXCEPTIONS",
+                "OCDS_TEST_VERSION",
+            )
+        },
+        # Codelist checks read the repository's codelists and the standard's codelists.
+        "files": {
+            path: file_digest(path) for path, name in walk() if name.endswith(".csv") or name == "extension.json"
+        },
+        "external_codelists": sorted(get_external_codelists()) if is_extension else None,
+        # Reference checks read the documents that the files reference, which are local schema files in the standard,
+        # and the standard's development schema in development mode.
+        "references": get_reference_digests(),
+    }
+
+
+def get_reference_digests():
+    """
+    Return the SHA-256 hex digest of each document that the JSON Schema files reference, directly or indirectly, or
+    ``None`` if the document can't be loaded.
+    """
+    prefetch_documents()
+
+    digests = {}
+    urls = [url for path, _ in json_schemas for url in iter_urls(read_json(path, patch)[1])]
+    while urls:
+        url = urls.pop()
+        if url in digests:
+            continue
+        try:
+            document = load_document(url)
+        except (OSError, ValueError):
+            digests[url] = None
+            continue
+        digests[url] = hashlib.sha256(json.dumps(document, sort_keys=True).encode()).hexdigest()
+        urls.extend(iter_urls(document))
+    return digests
+
+
+@pytest.mark.parametrize(("path", "name"), json_schemas)
+def test_schema_valid(path, name):
     """
     Ensures all JSON Schema files are valid JSON Schema Draft 4 and use codelists correctly. Unless this is an
     extension, ensures JSON Schema files have required metadata and valid references.
     """
+    text, data, _ = read_json(path, patch)
     schemas = metaschemas()
     validator_cls = Draft4Validator
 
@@ -585,7 +1142,21 @@ def test_schema_valid(path, name, text, data):
     else:
         metaschema = schemas["metaschema"]
 
-    validate_json_schema(path, name, data, metaschema, validator_cls=validator_cls)
+    def configuration():
+        return {
+            **get_result_configuration(),
+            "metaschema": hashlib.sha256(json.dumps(metaschema).encode()).hexdigest(),
+            "validator": validator_cls.__name__,
+        }
+
+    cached_check(
+        "test_schema_valid",
+        path,
+        lambda: hashlib.sha256(text.encode()).hexdigest(),
+        configuration,
+        lambda: validate_json_schema(path, name, data, metaschema, validator_cls=validator_cls),
+        tag=ocds_tag,
+    )
 
 
 @pytest.mark.skipif(
@@ -619,6 +1190,36 @@ def test_versioned_release_schema():
         )
 
 
+def check_urls(urls, max_workers=8):
+    """
+    Request the URLs concurrently, reusing one session per host, and return a message for each URL that fails to
+    respond with HTTP 200.
+
+    :param list urls: (method, URL) pairs
+    """
+    sessions = {urlsplit(url).netloc: requests.Session() for _, url in urls}
+
+    def check(method, url):
+        try:
+            # Like requests.head and requests.get, follow redirects for GET requests only.
+            response = sessions[urlsplit(url).netloc].request(method, url, allow_redirects=method == "GET", timeout=30)
+        # Timeouts, redirect loops and broken responses are failures, like connection errors.
+        except requests.RequestException:
+            return url
+        if response.status_code != 200:
+            return f"HTTP {response.status_code} on {url}"
+        return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            messages = list(executor.map(lambda args: check(*args), dict.fromkeys(urls)))
+    finally:
+        for session in sessions.values():
+            session.close()
+
+    return [message for message in messages if message]
+
+
 @pytest.mark.skipif(not is_extension, reason="not an extension (test_extension_json)")
 def test_extension_json():
     """
@@ -645,21 +1246,10 @@ def test_extension_json():
 
         validate_json_schema(path, "extension.json", data, schema)
 
-        for url in data.get("dependencies", []) + data.get("testDependencies", []):
-            try:
-                status_code = http_head(url).status_code
-            except requests.ConnectionError as e:
-                raise AssertionError(url) from e
-            else:
-                assert status_code == 200, f"HTTP {status_code} on {url}"
-
-        for url in list(data["documentationUrl"].values()):
-            try:
-                status_code = http_get(url).status_code  # allow redirects
-            except requests.ConnectionError as e:
-                raise AssertionError(url) from e
-            else:
-                assert status_code == 200, f"HTTP {status_code} on {url}"
+        urls = [("HEAD", url) for url in data.get("dependencies", []) + data.get("testDependencies", [])]
+        urls.extend(("GET", url) for url in data["documentationUrl"].values())  # allow redirects
+        failures = check_urls(urls)
+        assert not failures, "\n".join(failures)
 
         actual_codelists = set(data.get("codelists", []))
         if actual_codelists != expected_codelists:
@@ -696,30 +1286,40 @@ def test_json_merge_patch():
     else:
         url_pattern = development_base_url + "/{}"
 
-    for basename in basenames:
+    def get_url(basename):
         # Remove this condition after OCDS 1.2.0 released.
         if basename == "record-schema.json":
-            schemas[basename] = http_get(f"{development_base_url}/{basename}").json()
-        else:
-            schemas[basename] = http_get(url_pattern.format(basename)).json()
+            return f"{development_base_url}/{basename}"
+        return url_pattern.format(basename)
+
+    path = os.path.join(extension_dir, "extension.json")
+    with open(path) as f:
+        metadata = json.load(f, object_pairs_hook=rejecting_dict)
+
+    # Fetch the core schemas and the dependencies' files concurrently. Any errors are raised by the requests below.
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for basename in basenames:
+            executor.submit(http_get, get_url(basename))
+        prefetch_dependencies(executor, "release-schema.json", metadata)
+
+    for basename in basenames:
+        schemas[basename] = http_get(get_url(basename)).json()
 
         if basename == "release-schema.json":
-            path = os.path.join(extension_dir, "extension.json")
-            with open(path) as f:
-                metadata = json.load(f, object_pairs_hook=rejecting_dict)
-                schemas[basename] = extend_schema(basename, schemas[basename], metadata, codelists=external_codelists)
+            schemas[basename] = extend_schema(
+                basename, schemas[basename], metadata, codelists=get_external_codelists()
+            )
 
     # This loop is somewhat unnecessary, as repositories contain at most one of each schema file.
     for path, name, _, data in walk_json_data(patch):
         if is_json_merge_patch(data) and name in basenames:
-            unpatched = deepcopy(schemas[name])
             try:
-                patched = merge(unpatched, data)
+                patched, changed = merge(schemas[name], data)
             except Exception as e:
                 raise AssertionError(path) from e
 
             # All metadata should be present.
             validate_json_schema(path, name, patched, metaschemas()["metaschema"], full_schema=True)
 
-            # Empty patches aren't allowed. json_merge_patch mutates `unpatched`, so `schemas[name]` is tested.
-            assert patched != schemas[name]
+            # Empty patches aren't allowed.
+            assert changed
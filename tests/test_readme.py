@@ -1,20 +1,17 @@
-import csv
 import json
 import os
 import re
 import warnings
 from copy import deepcopy
-from io import StringIO
 
 import json_merge_patch
 import pytest
-from jscc.schema import extend_schema
 from jscc.testing.checks import validate_schema
-from jscc.testing.util import http_get
 from jsonschema import FormatChecker
 from jsonschema.validators import Draft4Validator
 from ocdsextensionregistry.util import replace_refs
 from ocdskit.schema import get_schema_fields
+from util import extend_schema, get_codelists, get_standard_codelists, http_get
 
 
 def read_metadata(*, allow_missing=False):
@@ -48,6 +45,8 @@ development_base_url = "https://raw.githubusercontent.com/open-contracting/stand
 ocds_tags = re.findall(r"\d+__\d+__\d+", http_get(ocds_schema_base_url).text)
 ocds_tag = ocds_version.replace(".", "__") if ocds_version else ocds_tags[-1]
 url_prefix = ocds_schema_base_url + ocds_tag if ocds_version or not use_development_version else development_base_url
+# The branch or tag of the standard at `url_prefix`.
+standard_ref = ocds_tag if ocds_version or not use_development_version else "1.2-dev"
 
 # Same as tests/fixtures/release_minimal.json in ocdskit.
 minimal_release = {
@@ -266,18 +265,15 @@ def test_example_codes():
 
     literals = set()
 
-    # Ostensibly, we should download all codelists. To save time, we only download those we presently reference.
-    for codelist in ("documentType", "milestoneStatus", "milestoneType", "partyRole", "releaseTag", "tenderStatus"):
-        for row in csv.DictReader(StringIO(http_get(f"{url_prefix}/codelists/{codelist}.csv").text)):
-            literals.add(row["Code"])
-
-    if "codelists" in metadata:
-        for codelist in metadata["codelists"]:
-            with open(os.path.join("codelists", codelist)) as f:
-                for row in csv.DictReader(f):
-                    literals.add(row["Code"])
-                    if "Category" in row:
-                        literals.add(row["Category"])
+    for codelist in get_standard_codelists(standard_ref).values():
+        literals.update(codelist["codes"])
+
+    codelists = get_codelists()
+    for name in metadata.get("codelists", []):
+        codelist = codelists.get(os.path.join(cwd, "codelists", name))
+        assert codelist is not None, f"codelists/{name} is in extension.json, but is missing or has no Code column"
+        literals.update(codelist["codes"])
+        literals.update(codelist["categories"])
 
     readme = read_readme()
 
@@ -0,0 +1,969 @@
+"""
+Helpers shared by the test files. install.sh downloads this file alongside them.
+"""
+
+import contextlib
+import csv
+import hashlib
+import importlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from copy import deepcopy
+from functools import cache, lru_cache, wraps
+from importlib.metadata import PackageNotFoundError, version
+from io import StringIO
+from itertools import repeat
+
+import json_merge_patch
+import requests
+from jscc.exceptions import DuplicateKeyError
+from jscc.schema import is_codelist
+from jscc.testing.filesystem import tracked
+
+cache_dir = os.getenv("OCDS_CACHE_DIR") or os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "standard-maintenance-scripts"
+)
+cache_ttl = int(os.getenv("OCDS_CACHE_TTL", "3600"))
+cache_size = int(os.getenv("OCDS_CACHE_SIZE", str(256 * 1024 * 1024)))
+cache_stats = Counter()
+# http_get is called from threads, like prefetch_dependencies.
+stats_lock = threading.Lock()
+evict_lock = threading.Lock()
+# The size of the object store in bytes, measured at the first write, to not walk the store on every write.
+store_size = None
+# JSON files larger than this number of bytes are checked by streaming, instead of being parsed in memory.
+stream_threshold = int(os.getenv("OCDS_STREAM_THRESHOLD", str(32 * 1024 * 1024)))
+result_cache = bool(os.getenv("OCDS_RESULT_CACHE", ""))
+result_stats = Counter()
+result_misses = []
+# Files are checked in this number of processes, if greater than 1.
+workers = int(os.getenv("OCDS_WORKERS", "1"))
+
+# The standard's development branches, whose codelists extensions can patch.
+standard_branches = ("1.1-dev", "1.2-dev")
+
+excluded = (".git", ".ve", ".venv", "_static", "build", "fixtures", "node_modules")
+
+
+class CachedResponse:
+    """
+    The parts of :class:`requests.Response` that the test files use.
+    """
+
+    status_code = 200
+
+    def __init__(self, url, content, headers):
+        self.url = url
+        self.content = content
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.encoding = requests.utils.get_encoding_from_headers(self.headers) or "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+
+def write_atomic(path, content):
+    """
+    Write bytes to a file, such that concurrent readers never see a partial file.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _object_path(digest):
+    return os.path.join(cache_dir, "objects", digest[:2], digest)
+
+
+def _read_object(entry):
+    path = _object_path(entry["sha256"])
+    with open(path, "rb") as f:
+        content = f.read()
+    # The modification time orders objects for eviction.
+    with contextlib.suppress(FileNotFoundError):  # evicted by another process, after reading
+        os.utime(path)
+    return CachedResponse(entry["url"], content, entry["headers"])
+
+
+def _count(key, value=1):
+    with stats_lock:
+        cache_stats[key] += value
+
+
+def _evict(added):
+    """
+    Add the size of a new object to the size of the object store, and evict the least recently used objects if the
+    store exceeds ``OCDS_CACHE_SIZE`` bytes.
+
+    The store is walked at the first write, and when it might exceed the limit. Objects written by other processes are
+    counted at the next walk.
+    """
+    global store_size  # noqa: PLW0603 # shared by threads
+
+    with evict_lock:
+        if store_size is not None:
+            store_size += added
+            if store_size <= cache_size:
+                return
+        _evict_objects()
+
+
+def _evict_objects():
+    global store_size  # noqa: PLW0603 # shared by threads
+
+    objects = []
+    for root, _, files in os.walk(os.path.join(cache_dir, "objects")):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            objects.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in objects)
+    if total <= cache_size:
+        store_size = total
+        return
+
+    # Evict to below the limit, so that the store isn't walked again at the next write.
+    for _, size, path in sorted(objects):
+        if total <= cache_size * 3 // 4:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        _count("evicted")
+
+    store_size = total
+
+
+@lru_cache
+def http_get(url):
+    """
+    Send an HTTP GET request, and cache the response on disk.
+
+    A cached response is reused for ``OCDS_CACHE_TTL`` seconds, after which it is revalidated using its ETag or
+    Last-Modified header. Response bodies are stored by SHA-256 digest, and the least recently used bodies are evicted
+    once the cache exceeds ``OCDS_CACHE_SIZE`` bytes.
+    """
+    entry_path = os.path.join(cache_dir, "urls", f"{hashlib.sha256(url.encode()).hexdigest()}.json")
+
+    try:
+        with open(entry_path) as f:
+            entry = json.load(f)
+        if not os.path.isfile(_object_path(entry["sha256"])):
+            entry = None
+    except (OSError, ValueError):
+        entry = None
+
+    if entry and time.time() - entry["fetched"] < cache_ttl:
+        try:
+            response = _read_object(entry)
+        except FileNotFoundError:  # evicted by another process, so fetch it again
+            entry = None
+        else:
+            _count("hit")
+            return response
+
+    request_headers = {}
+    if entry:
+        if "ETag" in entry["headers"]:
+            request_headers["If-None-Match"] = entry["headers"]["ETag"]
+        if "Last-Modified" in entry["headers"]:
+            request_headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+    response = requests.get(url, headers=request_headers, timeout=30)
+
+    if entry and response.status_code == 304:
+        _count("revalidated")
+        entry["fetched"] = time.time()
+        write_atomic(entry_path, json.dumps(entry).encode())
+        try:
+            return _read_object(entry)
+        except FileNotFoundError:  # evicted by another process
+            response = requests.get(url, timeout=30)
+
+    response.raise_for_status()
+
+    _count("miss")
+    _count("downloaded", len(response.content))
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    headers = {
+        key: response.headers[key] for key in ("Content-Type", "ETag", "Last-Modified") if key in response.headers
+    }
+    if not os.path.isfile(_object_path(digest)):
+        write_atomic(_object_path(digest), response.content)
+        _evict(len(response.content))
+    write_atomic(
+        entry_path, json.dumps({"url": url, "sha256": digest, "headers": headers, "fetched": time.time()}).encode()
+    )
+
+    return CachedResponse(url, response.content, headers)
+
+
+def http_cache_summary():
+    """
+    Return a one-line summary of the HTTP cache's use in this process.
+    """
+    return (
+        f"{cache_stats['hit'] + cache_stats['revalidated']} hits ({cache_stats['revalidated']} revalidated), "
+        f"{cache_stats['miss']} misses, {cache_stats['downloaded']:,} bytes downloaded, "
+        f"{cache_stats['evicted']} evicted ({cache_dir})"
+    )
+
+
+def extend_schema(basename, schema, metadata, codelists=None):
+    """
+    Copied from jscc.schema, to use the on-disk cache.
+    """
+
+    def recurse(metadata):
+        urls = metadata.get("dependencies", []) + metadata.get("testDependencies", [])
+        for metadata_url in urls:
+            patch_url = f"{metadata_url.rsplit('/', 1)[0]}/{basename}"
+            metadata = http_get(metadata_url).json()
+            patch = http_get(patch_url).json()
+            if codelists is not None:
+                codelists.update(metadata.get("codelists", []))
+            json_merge_patch.merge(patched, patch)
+            recurse(metadata)
+
+    patched = deepcopy(schema)
+    recurse(metadata)
+
+    return patched
+
+
+def prefetch_dependencies(executor, basename, metadata):
+    """
+    Fetch the files that :func:`extend_schema` requests, concurrently for each level of the dependency tree. Any errors
+    are raised when the files are requested again.
+    """
+    seen = set()
+    urls = metadata.get("dependencies", []) + metadata.get("testDependencies", [])
+    while urls:
+        futures = []
+        for metadata_url in urls:
+            if metadata_url not in seen:
+                seen.add(metadata_url)
+                futures.append(executor.submit(http_get, metadata_url))
+                executor.submit(http_get, f"{metadata_url.rsplit('/', 1)[0]}/{basename}")
+
+        urls = []
+        for future in futures:
+            if not future.exception():
+                metadata = future.result().json()
+                urls.extend(metadata.get("dependencies", []) + metadata.get("testDependencies", []))
+
+
+# The functions below walk the repository once per session, and cache the most recently read and parsed files. The
+# walk_* and get_* functions are copied from jscc.testing, to use this index.
+
+
+@lru_cache
+def _walk():
+    files = []
+    for root, dirs, names in os.walk(os.getcwd()):
+        for directory in excluded:
+            if directory in dirs:
+                dirs.remove(directory)
+        files.extend((os.path.join(root, name), name) for name in names)
+    return files
+
+
+def walk(top=None):
+    """
+    Yield the path and name of each file under the directory (default the current working directory), excluding
+    ``excluded`` directories.
+    """
+    if top is None:
+        yield from _walk()
+    else:
+        prefix = os.path.join(os.path.abspath(top), "")
+        yield from ((path, name) for path, name in _walk() if path.startswith(prefix))
+
+
+# The total size in bytes of the files whose contents are cached. Larger files aren't cached, to bound memory use in
+# repositories with many or large files, like sample-data.
+file_cache_size = 16 * 1024 * 1024
+file_size_limit = 1024 * 1024
+
+
+def file_cache(function):
+    """
+    Cache the results of a function whose first argument is a file path, like ``functools.lru_cache``, but bound the
+    cache by the total size of the files, instead of the number of results. Files larger than ``file_size_limit`` are
+    never cached.
+
+    Call the decorated function with ``store=False`` to reuse a cached result, without caching a new result.
+    """
+    results = OrderedDict()
+    total = 0
+    lock = threading.Lock()
+
+    @wraps(function)
+    def wrapper(path, *args, store=True):
+        nonlocal total
+        key = (path, *args)
+        with lock:
+            if key in results:
+                results.move_to_end(key)
+                return results[key][1]
+
+        result = function(path, *args)
+
+        size = os.path.getsize(path)
+        if store and size <= file_size_limit:
+            with lock:
+                if key not in results:
+                    results[key] = (size, result)
+                    total += size
+                    while total > file_cache_size:
+                        _, (evicted, _) = results.popitem(last=False)
+                        total -= evicted
+        return result
+
+    def cache_clear():
+        nonlocal total
+        with lock:
+            results.clear()
+            total = 0
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+
+@file_cache
+def read_text(path, newline=None):
+    with open(path, newline=newline) as f:
+        return f.read()
+
+
+@file_cache
+def read_json(path, patch=None):
+    """
+    Return a JSON file's text (after patching), its data, and its first duplicate key, if any.
+
+    :raises json.JSONDecodeError: if the file isn't valid JSON
+    """
+    # The text is cached with the data.
+    text = read_text(path, store=False)
+    if patch:
+        text = patch(text)
+
+    duplicates = []
+
+    def object_pairs_hook(pairs):
+        data = dict(pairs)
+        if len(data) < len(pairs) and not duplicates:
+            seen = set()
+            duplicates.extend(key for key, _ in pairs if key in seen or seen.add(key))
+        return data
+
+    data = json.loads(text, object_pairs_hook=object_pairs_hook)
+    return text, data, duplicates[0] if duplicates else None
+
+
+@file_cache
+def read_csv(path):
+    """
+    Return a CSV file's text, fieldnames and rows.
+
+    :raises csv.Error: if the file isn't valid CSV
+    """
+    text = read_text(path, "", store=False)
+    reader = csv.DictReader(StringIO(text))
+    return text, reader.fieldnames, list(reader)
+
+
+def walk_json_data(patch=None, top=None):
+    """
+    Like jscc.testing.filesystem.walk_json_data, but skips files larger than ``OCDS_STREAM_THRESHOLD`` bytes.
+    """
+    for path, name in walk(top):
+        if path.endswith(".json") and not is_large(path) and os.path.getsize(path):
+            try:
+                text, data, _ = read_json(path, patch)
+            except json.JSONDecodeError:
+                continue
+            yield path, name, text, data
+
+
+def walk_csv_data(top=None):
+    for path, name in walk(top):
+        if path.endswith(".csv"):
+            try:
+                text, fieldnames, rows = read_csv(path)
+            except csv.Error:
+                continue
+            yield path, name, text, fieldnames, rows
+
+
+def is_large(path):
+    return os.path.getsize(path) > stream_threshold
+
+
+json_token = re.compile(
+    r"([ \t\n\r]*)"  # whitespace
+    r'(?:("(?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*")'  # string
+    r"|(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?)"  # number
+    r"|([{}\[\]:,])"  # punctuation
+    r"|(true|false|null|NaN|Infinity|-Infinity))"  # literal
+)
+STRING, NUMBER, PUNCTUATION, LITERAL = range(2, 6)
+
+
+def is_indented_token(kind, token):
+    """
+    Return whether a string or number token is as serialized by ``json.dumps``.
+    """
+    if kind == STRING:
+        return "\\" not in token or json.dumps(json.loads(token), ensure_ascii=False) == token
+    if kind == NUMBER:
+        if "." in token or "e" in token or "E" in token:
+            return json.dumps(float(token)) == token
+        return str(int(token)) == token
+    return True
+
+
+class StreamedJSONDecodeError(json.JSONDecodeError):
+    """
+    A JSON decoding error whose line and column are counted while streaming, instead of computed from the document.
+
+    Unlike ``json.JSONDecodeError``, its position is kept when pickled, to return it from :func:`map_files` workers.
+    """
+
+    def __init__(self, msg, pos, lineno, colno):
+        ValueError.__init__(self, f"{msg}: line {lineno} column {colno} (char {pos})")
+        self.msg = msg
+        self.doc = ""
+        self.pos = pos
+        self.lineno = lineno
+        self.colno = colno
+
+    def __reduce__(self):
+        return self.__class__, (self.msg, self.pos, self.lineno, self.colno)
+
+
+@cache
+def scan_json(path, chunk_size=1024 * 1024):
+    """
+    Parse a JSON file token by token, without building its data.
+
+    Return the error if the file is invalid (like :func:`get_invalid_json_files`), whether the file is indented as
+    expected (like :func:`get_misindented_files`), and whether its value is empty (like :func:`get_empty_files`).
+    """
+    # For each open container: None for an array, or a list of the object's keys and its first duplicate key.
+    stack = []
+    # What is expected next: "value", "key", "colon", or "delimiter" (a comma, closing bracket, or the end of file).
+    state = "value"
+    # Whether the current container was just opened, and can be closed without whitespace.
+    opened = False
+    # The whitespace expected before the next token.
+    indent = ""
+    indented = True
+    empty = None
+
+    def error(message, pos):
+        return StreamedJSONDecodeError(message, pos, line, pos - line_start + 1), False, False
+
+    with open(path) as f:
+        buffer = f.read(chunk_size)
+        size = len(buffer)
+        offset = 0  # the position of the buffer in the file
+        index = 0  # the position in the buffer
+        eof = False
+        line = 1
+        line_start = 0
+
+        if buffer.startswith("\ufeff"):
+            return error("Unexpected UTF-8 BOM (decode using utf-8-sig)", 0)
+
+        while True:
+            match = json_token.match(buffer, index)
+
+            # The token might continue in the next chunk. "1e+5" matches "1" until its last digit is read.
+            if (not match or size - match.end() < 3) and not eof:
+                chunk = f.read(max(chunk_size, size - index))
+                if chunk:
+                    buffer = buffer[index:] + chunk
+                    size = len(buffer)
+                    offset += index
+                    index = 0
+                else:
+                    eof = True
+                continue
+
+            if not match:
+                whitespace = buffer[index:]
+                token = whitespace.lstrip(" \t\n\r")
+                whitespace = whitespace[: len(whitespace) - len(token)]
+            else:
+                kind = match.lastindex
+                whitespace, token = match.group(1), match.group(kind)
+
+            if "\n" in whitespace:
+                line += whitespace.count("\n")
+                line_start = offset + index + whitespace.rindex("\n") + 1
+            pos = offset + index + len(whitespace)
+
+            if not match:
+                if token:
+                    return error(
+                        {
+                            "value": "Expecting value",
+                            "key": "Expecting property name enclosed in double quotes",
+                            "colon": "Expecting ':' delimiter",
+                            "delimiter": "Expecting ',' delimiter" if stack else "Extra data",
+                        }[state],
+                        pos,
+                    )
+                if state != "delimiter" or stack:
+                    return error("Expecting value", pos)
+                # The file must end with one newline.
+                return None, indented and whitespace == "\n", empty
+
+            index = match.end()
+
+            if state == "value":
+                if token == "]" and opened and stack[-1] is None:
+                    indented = indented and not whitespace
+                    stack.pop()
+                    if not stack and empty is None:
+                        empty = True
+                    state = "delimiter"
+                elif kind != PUNCTUATION or token in {"{", "["}:
+                    indented = indented and whitespace == indent and is_indented_token(kind, token)
+                    if empty is None and not stack and token not in {"{", "["}:
+                        empty = token in {'""', "null"}
+                    if token == "{":
+                        stack.append([set(), None])
+                        state = "key"
+                    elif token == "[":
+                        stack.append(None)
+                    else:
+                        state = "delimiter"
+                    opened = token in {"{", "["}
+                    indent = "\n" + "  " * len(stack)
+                else:
+                    return error("Expecting value", pos)
+            elif state == "key":
+                if token == "}" and opened:
+                    indented = indented and not whitespace
+                    stack.pop()
+                    if not stack and empty is None:
+                        empty = True
+                    state = "delimiter"
+                elif kind == STRING:
+                    indented = indented and whitespace == indent and is_indented_token(kind, token)
+                    keys, duplicate = stack[-1]
+                    key = json.loads(token) if "\\" in token else token[1:-1]
+                    if key in keys and duplicate is None:
+                        stack[-1][1] = key
+                    keys.add(key)
+                    state = "colon"
+                else:
+                    return error("Expecting property name enclosed in double quotes", pos)
+            elif state == "colon":
+                if token != ":":
+                    return error("Expecting ':' delimiter", pos)
+                indented = indented and not whitespace
+                state = "value"
+                opened = False
+                indent = " "
+            elif not stack:
+                return error("Extra data", pos)
+            elif token == ",":
+                indented = indented and not whitespace
+                state = "value" if stack[-1] is None else "key"
+                opened = False
+                indent = "\n" + "  " * len(stack)
+            elif token == ("]" if stack[-1] is None else "}"):
+                indented = indented and whitespace == "\n" + "  " * (len(stack) - 1)
+                frame = stack.pop()
+                # Like `read_json`, report the first duplicate key of the first object to close.
+                if frame is not None and frame[1] is not None:
+                    return DuplicateKeyError(frame[1]), False, False
+                if not stack and empty is None:
+                    empty = False
+            else:
+                return error("Expecting ',' delimiter", pos)
+
+
+# The per-file checks below reuse cached files, but don't cache files, as most aren't read again.
+
+
+def get_empty_files(include):
+    for path, name in walk():
+        if tracked(path) and include(path, name) and name != "__init__.py":
+            if is_large(path):
+                if name.endswith(".json"):
+                    error, _, empty = scan_json(path)
+                    if not error and empty:
+                        yield (path,)
+                continue  # a large file is non-empty, unless its JSON value is empty
+
+            try:
+                # Only JSON files are parsed by other checks.
+                if name.endswith(".json"):
+                    text = read_text(path, store=False)
+                else:
+                    with open(path) as f:
+                        text = f.read()
+            except UnicodeDecodeError:
+                continue  # the file is non-empty, and might be binary
+
+            if not text.strip():
+                yield (path,)
+            elif name.endswith(".json"):
+                try:
+                    _, value, _ = read_json(path, store=False)
+                    if not value and not isinstance(value, (bool, int, float)):
+                        yield (path,)
+                except json.JSONDecodeError:
+                    continue  # the file is non-empty
+
+
+def is_misindented(path):
+    """
+    Return whether a JSON file is non-empty and valid, but not indented as expected.
+    """
+    if is_large(path):
+        error, indented, _ = scan_json(path)
+        return not error and not indented
+
+    if not os.path.getsize(path):
+        return False
+    try:
+        text, data, _ = read_json(path, store=False)
+    except json.JSONDecodeError:
+        return False
+    return text != json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+
+
+def get_misindented_files(include):
+    paths = [path for path, name in walk() if path.endswith(".json") and tracked(path) and include(path, name)]
+    results = map_files(is_misindented, [(path,) for path in paths])
+    misindented = [path for path, value in zip(paths, results, strict=True) if value]
+
+    # Yield the files that are parsed in memory, then the files that are streamed.
+    yield from ((path,) for path in misindented if not is_large(path))
+    yield from ((path,) for path in misindented if is_large(path))
+
+
+def get_json_error(path):
+    """
+    Return the error if a JSON file is non-empty and invalid, or ``None``.
+    """
+    if is_large(path):
+        error, _, _ = scan_json(path)
+        return error
+
+    if not os.path.getsize(path):
+        return None
+    try:
+        _, _, duplicate = read_json(path, store=False)
+    except json.JSONDecodeError as e:
+        return e
+    if duplicate is not None:
+        return DuplicateKeyError(duplicate)
+    return None
+
+
+def get_invalid_json_files():
+    paths = [path for path, _ in walk() if path.endswith(".json")]
+    for path, error in zip(paths, map_files(get_json_error, [(path,) for path in paths]), strict=True):
+        if error:
+            yield path, error
+
+
+# The functions below index the codes and categories of codelists, by codelist name. The standard's codelists are
+# indexed once per branch commit or tag, and the indexes are stored in the cache directory.
+
+
+def _index_codelist(rows):
+    codes = []
+    categories = []
+    for row in rows:
+        codes.append(row["Code"] if "Code" in row else row["code"])
+        if row.get("Category") and row["Category"] not in categories:
+            categories.append(row["Category"])
+    return {"codes": codes, "categories": categories}
+
+
+@lru_cache
+def get_codelists():
+    """
+    Return the codes and categories of the repository's codelist CSV files, by path, in walk order.
+    """
+    return {
+        path: _index_codelist(rows)
+        for path, _, _, fieldnames, rows in walk_csv_data()
+        if fieldnames and is_codelist(fieldnames)
+    }
+
+
+def get_codelist(name):
+    """
+    Return the codes and categories of the first of the repository's codelist CSV files with the given file name, or
+    ``None``.
+    """
+    for path, codelist in get_codelists().items():
+        if os.path.basename(path) == name:
+            return codelist
+    return None
+
+
+@lru_cache
+def get_standard_commits():
+    """
+    Return the current commits of the standard's development branches.
+    """
+    output = subprocess.run(
+        [
+            "git",
+            "ls-remote",
+            "https://github.com/open-contracting/standard.git",
+            *(f"refs/heads/{ref}" for ref in standard_branches),
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+        timeout=30,
+    ).stdout
+    commits = {}
+    for line in output.splitlines():
+        commit, ref = line.split("\t")
+        commits[ref.removeprefix("refs/heads/")] = commit
+    return commits
+
+
+def _get_tag_codelists(tag):
+    def collect(data):
+        if isinstance(data, list):
+            for item in data:
+                collect(item)
+        elif isinstance(data, dict):
+            if isinstance(data.get("codelist"), str):
+                names.add(data["codelist"])
+            for value in data.values():
+                collect(value)
+
+    url_prefix = f"https://standard.open-contracting.org/schema/{tag}"
+    names = set()
+    collect(http_get(f"{url_prefix}/release-schema.json").json())
+
+    def index(name):
+        reader = csv.DictReader(StringIO(http_get(f"{url_prefix}/codelists/{name}").text))
+        if reader.fieldnames and is_codelist(reader.fieldnames):
+            return _index_codelist(reader)
+        return None
+
+    names = sorted(names)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        codelists = list(executor.map(index, names))
+    return {name: codelist for name, codelist in zip(names, codelists, strict=True) if codelist is not None}
+
+
+@lru_cache
+def get_standard_codelists(ref):
+    """
+    Return the codes and categories of the standard's codelist CSV files at a development branch or a release tag (like
+    ``1__1__5``, the same as the schema directory), by file name.
+
+    A branch's index is rebuilt from the branch's zip archive only if the branch's commit changed. A tag's index is
+    built from the codelists that the tag's release schema references, which are requested with :func:`http_get`, and
+    is never rebuilt.
+    """
+    commit = get_standard_commits()[ref] if ref in standard_branches else None
+
+    path = os.path.join(cache_dir, "codelists", f"{ref}.json")
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    if "codes" not in index and commit is None:
+        index = {"commit": None, "codes": _get_tag_codelists(ref)}
+        write_atomic(path, json.dumps(index).encode())
+    elif "codes" not in index or index.get("commit") != commit:
+        response = requests.get(f"https://codeload.github.com/open-contracting/standard/zip/{commit}", timeout=30)
+        response.raise_for_status()
+        codes = {}
+        with zipfile.ZipFile(io.BytesIO(response.content)) as z:
+            for name in z.namelist():
+                # The archive's top-level directory is named after the repository and commit.
+                if os.path.dirname(name.partition("/")[2]) == "schema/codelists" and name.endswith(".csv"):
+                    with z.open(name) as f:
+                        reader = csv.DictReader(io.TextIOWrapper(f, "utf-8", newline=""))
+                        if reader.fieldnames and is_codelist(reader.fieldnames):
+                            codes[os.path.basename(name)] = _index_codelist(reader)
+        index = {"commit": commit, "codes": codes}
+        write_atomic(path, json.dumps(index).encode())
+
+    return index["codes"]
+
+
+# The function below checks files in parallel, if OCDS_WORKERS is greater than 1.
+
+
+def _call(function, args):
+    """
+    Call the function in a worker process, and return its result, its warnings, and the changes to the statistics.
+    """
+    http, results, misses = Counter(cache_stats), Counter(result_stats), len(result_misses)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        result = function(*args)
+    return result, [w.message for w in caught], cache_stats - http, result_stats - results, result_misses[misses:]
+
+
+def map_files(function, arguments):
+    """
+    Yield the result of calling the function with each tuple of arguments, in order.
+
+    If ``OCDS_WORKERS`` is greater than 1, the calls are made in that many processes. Each call's warnings are issued
+    again in this process, in order, such that the output is the same as if the calls were made in this process. The
+    function must be defined at the top level of a module.
+    """
+    if workers < 2 or len(arguments) < 2:
+        for args in arguments:
+            yield function(*args)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        for result, caught, http, results, misses in executor.map(_call, repeat(function), arguments):
+            for message in caught:
+                warnings.warn(message, stacklevel=2)
+            cache_stats.update(http)
+            result_stats.update(results)
+            result_misses.extend(misses)
+            yield result
+
+
+# The functions below cache the results of checks on files, if OCDS_RESULT_CACHE is set.
+
+
+@cache
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache
+def library_versions():
+    versions = {"python": sys.version}
+    for name in ("jscc", "json-merge-patch", "jsonref", "jsonschema", "ocdskit"):
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def cached_check(name, path, digest, configuration, function, *args, tag=None):
+    """
+    Call the function, and return its result.
+
+    If ``OCDS_RESULT_CACHE`` is set, the result, its warnings, and any assertion error are stored in the cache
+    directory, keyed by the check's name and the file's path. If the file's content, the check's configuration, the
+    upstream schema tag and the library versions are unchanged in a later run, the result is reused and its warnings
+    are replayed, instead of calling the function.
+
+    :param digest: a function that returns the SHA-256 hex digest of the file's content
+    :param configuration: a function that returns any JSON-serializable inputs to the check, other than the file's
+                          content
+    """
+    if not result_cache:
+        return function(*args)
+
+    # The inputs can be costly to compute, so they are computed only if results are cached.
+    inputs = {
+        "content": digest(),
+        "configuration": hashlib.sha256(
+            json.dumps([configuration(), file_digest(__file__)], sort_keys=True, default=str).encode()
+        ).hexdigest(),
+        "tag": tag,
+        "libraries": library_versions(),
+    }
+    key = hashlib.sha256(f"{name}\0{os.path.abspath(path)}".encode()).hexdigest()
+    entry_path = os.path.join(cache_dir, "results", f"{key}.json")
+
+    try:
+        with open(entry_path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = None
+
+    if entry and entry["inputs"] == inputs:
+        result_stats["hit"] += 1
+    else:
+        if entry:
+            reason = ", ".join(f"{k} changed" for k, v in inputs.items() if entry["inputs"].get(k) != v)
+        else:
+            reason = "new"
+        result_stats["miss"] += 1
+        result_misses.append((name, path, reason))
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            try:
+                result = function(*args)
+                error = None
+            except AssertionError as e:
+                result = None
+                error = str(e)
+
+        entry = {
+            "inputs": inputs,
+            "result": result,
+            "error": error,
+            "warnings": [[w.category.__module__, w.category.__qualname__, str(w.message)] for w in caught],
+        }
+        write_atomic(entry_path, json.dumps(entry).encode())
+
+    for module, qualname, message in entry["warnings"]:
+        try:
+            category = getattr(importlib.import_module(module), qualname)
+        except (ImportError, AttributeError):
+            category = UserWarning
+        warnings.warn(message, category, stacklevel=2)
+    if entry["error"] is not None:
+        raise AssertionError(entry["error"])
+    return entry["result"]
+
+
+def result_cache_summary():
+    """
+    Return a summary of the result cache's use in this process, with the reason for each miss.
+    """
+    new = sum(1 for _, _, reason in result_misses if reason == "new")
+    lines = [f"{result_stats['hit']} hits, {result_stats['miss']} misses ({new} new) ({cache_dir})"]
+    lines.extend(f"{name} {path}: {reason}" for name, path, reason in result_misses if reason != "new")
+    return lines